@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measures the throughput of the library against the BMC simulator.
+
+Each benchmark is run several times and the minimum and median duration
+is reported. With --save the results are written to a JSON file, with
+--compare the results are compared to such a file and the script fails if
+a benchmark got slower by more than --threshold.
+
+    python benchmarks/bench.py --save baseline.json
+    python benchmarks/bench.py --compare baseline.json --threshold 1.25
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from IpmiLibrary import IpmiLibrary
+from IpmiLibrary.simulator import (BmcSimulator, full_sensor_sdr, sel_entry,
+        fru_image, sine)
+
+
+SEL_ENTRIES = 4096
+SDR_RECORDS = 500
+FRU_SIZE = 8192
+HPM_IMAGE_SIZE = 1024 * 1024
+SENSORS = 64
+
+
+def create_simulator():
+    # sensor numbers above 255 are continued on the next LUN
+    sdrs = [full_sensor_sdr(n, n & 0xff, 'Sensor %d' % n, 0x01,
+            owner_lun=n >> 8) for n in range(1, SDR_RECORDS + 1)]
+    now = time.time()
+    sel = [sel_entry(n, now, 0x01, n % 256)
+            for n in range(1, SEL_ENTRIES + 1)]
+    sensors = dict((n, sine(0x80, 0x20, 10))
+            for n in range(1, SENSORS + 1))
+    return BmcSimulator(sdrs=sdrs, sel=sel, fru={0: fru_image(FRU_SIZE)},
+            sensors=sensors)
+
+
+def bench_sel_prefetch(lib):
+    for key in ('prefetched_sel_records', 'polled_sel_records'):
+        lib._cp.pop(key, None)
+    lib.prefetch_sel()
+
+
+def bench_sdr_walk(lib):
+    lib._invalidate_sdr_catalog()
+    lib.prefetch_sdr_list()
+
+
+def bench_fru_read(lib):
+    lib._cp.pop('prefetched_fru_data', None)
+    lib._cp.pop('fru_inventories', None)
+    lib.prefetch_fru_data(0)
+
+
+def bench_hpm_upload(lib):
+    lib._ipmi.initiate_upgrade_action(1, 2)
+    lib._ipmi.upload_binary(b'\xa5' * HPM_IMAGE_SIZE)
+    lib._ipmi.finish_firmware_upload(0, HPM_IMAGE_SIZE)
+
+
+def bench_sensor_readings(lib):
+    lib.get_sensor_readings(['Sensor %d' % n for n in range(1, SENSORS + 1)])
+
+
+BENCHMARKS = [
+    ('sel_prefetch_%d' % SEL_ENTRIES, bench_sel_prefetch),
+    ('sdr_walk_%d' % SDR_RECORDS, bench_sdr_walk),
+    ('fru_read_%d' % FRU_SIZE, bench_fru_read),
+    ('hpm_upload_%d' % HPM_IMAGE_SIZE, bench_hpm_upload),
+    ('sensor_readings_%d' % SENSORS, bench_sensor_readings),
+]
+
+
+def run(interface_type, repeat, selected):
+    bmc = create_simulator()
+    bmc.start()
+    lib = IpmiLibrary()
+    try:
+        lib.open_ipmi_lan_connection('127.0.0.1', 0x20, port=bmc.port,
+                interface_type=interface_type)
+        lib.prefetch_sdr_list()
+        results = {}
+        for (name, func) in BENCHMARKS:
+            if selected and name.split('_')[0] not in selected:
+                continue
+            durations = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(lib)
+                durations.append(time.perf_counter() - start)
+            results['%s/%s' % (interface_type, name)] = {
+                'min': min(durations),
+                'median': statistics.median(durations),
+            }
+        lib.close_all_ipmi_connections()
+    finally:
+        bmc.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--interface', action='append',
+            help='interface types to measure (default: rmcp and pipelinedrmcp)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', action='append',
+            help='run only the benchmarks starting with this word')
+    parser.add_argument('--save', help='write the results to a JSON file')
+    parser.add_argument('--compare', help='compare with a JSON file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+            help='maximum ratio of the median to the compared one')
+    args = parser.parse_args()
+
+    results = {}
+    for interface_type in args.interface or ['rmcp', 'pipelinedrmcp']:
+        results.update(run(interface_type, args.repeat, args.only))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    regressions = []
+    for (name, result) in sorted(results.items()):
+        line = '%-36s min %8.1f ms  median %8.1f ms' % (name,
+                result['min'] * 1000, result['median'] * 1000)
+        if name in baseline:
+            ratio = result['median'] / baseline[name]['median']
+            line += '  %5.2fx' % ratio
+            if ratio > args.threshold:
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if regressions:
+        print('%d benchmark(s) got slower than %.2fx' % (len(regressions),
+                args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,7 +13,9 @@
 # limitations under the License.
 
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 #from sel import SelRecord
 from subprocess import Popen, PIPE
 
@@ -28,10 +30,13 @@ import pyipmi
 import pyipmi.logger
 import pyipmi.interfaces
 import pyipmi.msgs
-from pyipmi.errors import IpmiTimeoutError
+from pyipmi.errors import CompletionCodeError, IpmiTimeoutError
 
 from .utils import int_any_base
 from .mapping import *
+from .cache import FileCache
+from .interfaces import (InterfaceWrapper, SynchronizedInterface,
+        ReconnectingInterface, InstrumentedInterface, create_interface)
 
 from .sdr import Sdr
 from .sel import Sel
@@ -41,6 +46,7 @@ from .picmg import Picmg
 from .hpm import Hpm
 from .chassis import Chassis
 from .lan import Lan
+from .sampler import SensorSampling
 
 class RobotLogHandler(logging.Handler):
     # mappping from logging to robots log levels
@@ -81,18 +87,44 @@ class IpmiConnection():
         self._properties['sdr_source'] = 'sensor device'
 
     def close(self):
+        if 'sensor_sampler' in self._properties:
+            self._properties['sensor_sampler'].stop()
+        if isinstance(self._ipmi.interface, ReconnectingInterface):
+            self._ipmi.interface.stop_keepalive()
         self._ipmi.close()
 
 
-class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
+class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan,
+        SensorSampling):
 
     ROBOT_LIBRARY_VERSION = '0.0.1'
     ROBOT_LIBRARY_SCOPE = 'TEST SUITE'
 
-    def __init__(self, timeout=3.0, poll_interval=1.0):
+    def __init__(self, timeout=3.0, poll_interval=1.0, cache_dir=None):
         self._cache = ConnectionCache()
         self._timeout = timeout
         self._poll_interval = poll_interval
+        self._file_cache = None
+        if cache_dir is not None:
+            self._file_cache = FileCache(cache_dir)
+        self._connection_override = threading.local()
+        self._main_connection = None
+
+    @property
+    def _active_connection(self):
+        """Currently active connection.
+
+        Within `Run Keyword On IPMI Connections` every worker thread has its
+        own active connection.
+        """
+        connection = getattr(self._connection_override, 'connection', None)
+        if connection is not None:
+            return connection
+        return self._main_connection
+
+    @_active_connection.setter
+    def _active_connection(self, value):
+        self._main_connection = value
 
     @property
     def _ipmi(self):
@@ -136,12 +168,35 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
 
     def open_ipmi_lan_connection(self, host, target_address, user='', password='',
             routing_information=None, port=623, interface_type='ipmitool',
-            alias=None, max_retries=0):
+            alias=None, max_retries=0, trace_file=None, replay_speed=None):
         """Opens a LAN connection to an IPMI shelf manager.
 
         `host` is the IP or hostname of the shelf manager. `target_address` the
         IPMI address to which the command should be sent. `user` and `password`
         are used to authenticate against the shelf manager.
+
+        A lost session is established again transparently, see `Get Session
+        Reconnects` and `Set Session Keepalive Interval`.
+
+        `interface_type` is one of the LAN interfaces of pyipmi (`ipmitool`,
+        `rmcp`), `pipelinedrmcp` or `ipmitoolshell`. `pipelinedrmcp` is the
+        `rmcp` interface which, where a keyword sends several independent
+        requests (e.g. `Get Sensor Readings` or reading FRU data), keeps
+        them in flight at once on the same session. Other requests are sent
+        like by `rmcp`. Like `rmcp` it talks IPMI v1.5 only. `ipmitoolshell`
+        keeps one `ipmitool shell` process running instead of starting
+        ipmitool for every request.
+
+        With `record:<interface_type>` (e.g. `record:rmcp`) every request
+        and its response is recorded to `trace_file`. With `replay` the
+        requests are answered from such a `trace_file` without a device,
+        e.g. to reproduce a failure offline or to benchmark the library.
+        The responses are returned at once, or with the recorded latency
+        divided by `replay_speed` if it is given.
+
+        Example:
+        | Open IPMI LAN Connection | 10.0.0.1 | 0x20 | admin | admin | interface_type=record:rmcp | trace_file=shelf.trace |
+        | Open IPMI LAN Connection | 10.0.0.1 | 0x20 | interface_type=replay | trace_file=shelf.trace | replay_speed=1 |
         """
 
         host = str(host)
@@ -150,12 +205,18 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
         password = str(password)
         port = int_any_base(port)
 
-        interface = pyipmi.interfaces.create_interface(interface_type,
-                                                       max_retries=max_retries)
         session = pyipmi.Session()
         session.set_session_type_rmcp(host, port)
         session.set_auth_type_user(user, password)
 
+        if replay_speed is not None:
+            replay_speed = float(replay_speed)
+
+        interface = create_interface(interface_type, max_retries=max_retries,
+                trace_file=trace_file, replay_speed=replay_speed)
+        interface = ReconnectingInterface(InstrumentedInterface(interface),
+                session)
+
         target = pyipmi.Target(target_address, routing_information)
 
         self._info('Opening IPMI connection to %s:%d/%02Xh' % (host,
@@ -164,8 +225,10 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
         ipmi = pyipmi.Ipmi(interface=interface, session=session, target=target)
 
         ipmi.open()
+        interface.start_keepalive()
 
         connection = IpmiConnection(ipmi, target)
+        connection._properties['unit_address'] = '%s:%d' % (host, port)
 
         self._active_connection = connection
 
@@ -195,6 +258,7 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
         interface = pyipmi.interfaces.create_interface('aardvark',
                 slave_address=slave_address, port=port, serial_number=serial,
                 enable_i2c_pullups=enable_i2c_pullups)
+        interface = SynchronizedInterface(InstrumentedInterface(interface))
         target = pyipmi.Target(target_address, routing_information)
 
         self._info('Opening IPMI aardvark connection to %02Xh' % target_address)
@@ -203,6 +267,8 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
         ipmi.open()
 
         connection = IpmiConnection(ipmi, target)
+        connection._properties['unit_address'] = \
+                'aardvark:%s' % (serial or port,)
 
         self._active_connection = connection
 
@@ -225,15 +291,22 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
         """Returns the index of the currently active IPMI connection."""
         return self._cache.current_index
 
-    def close_all_ipmi_connections(self):
+    def close_all_ipmi_connections(self, log_statistics=False):
         """Closes all open connections and empties the connection cache.
 
         After this keyword, new indexes got from the `Open Connection`
         keyword are reset to 1.
 
+        If `log_statistics` is true, the statistics of every connection (see
+        `Get IPMI Statistics`) are logged before.
+
         This keyword should be used in a test or suite teardown to
         make sure all connections are closed.
         """
+        if log_statistics:
+            for index in range(1, len(self._cache) + 1):
+                connection = self._cache.get_connection(index)
+                self._log_ipmi_statistics(index, connection)
         self._active_connection = self._cache.close_all()
 
     def close_ipmi_connection(self, loglevel=None):
@@ -242,6 +315,114 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
         self._active_connection.close()
 
 
+    def _send_messages(self, reqs):
+        """Sends the requests to the target of the active connection and
+        returns their responses, like `send_message` of pyipmi.
+
+        Interfaces which can have several requests in flight (e.g.
+        `pipelinedrmcp`) send all requests at once. A request the target
+        rejected as busy is sent again by pyipmi, which retries it.
+        """
+        send_and_receive_many = getattr(self._ipmi.interface,
+                'send_and_receive_many', None)
+        if send_and_receive_many is None:
+            return [self._ipmi.send_message(req) for req in reqs]
+
+        for req in reqs:
+            req.target = self._ipmi.target
+            req.requester = self._ipmi.requester
+        rsps = send_and_receive_many(reqs)
+        for (i, rsp) in enumerate(rsps):
+            if (isinstance(rsp, CompletionCodeError)
+                    and rsp.cc == pyipmi.msgs.constants.CC_NODE_BUSY):
+                rsps[i] = self._ipmi.send_message(reqs[i])
+            elif isinstance(rsp, Exception):
+                raise rsp
+        return rsps
+
+    def _run_keyword_on_connection(self, connection, method, args):
+        previous = getattr(self._connection_override, 'connection', None)
+        self._connection_override.connection = connection
+        try:
+            return method(*args)
+        finally:
+            self._connection_override.connection = previous
+
+    def _bridged_connection(self, address, channel):
+        """Returns a connection to the IPM controller at the IPMB `address`,
+        bridged over `channel` by the controller of the active connection.
+
+        The connection shares the interface and session of the active
+        connection, but has its own properties.
+        """
+        target = self._ipmi.target
+        if target.routing:
+            hops = [(r.rq_sa, r.rs_sa, r.channel) for r in target.routing]
+        elif getattr(self._ipmi.interface, 'NAME', None) == 'aardvark':
+            # on the IPMB every controller is addressed directly
+            hops = None
+        else:
+            hops = [(getattr(self._ipmi.interface, 'slave_address', 0x81),
+                    target.ipmb_address, None)]
+        if hops:
+            (rq_sa, rs_sa, _) = hops[-1]
+            hops[-1] = (rq_sa, rs_sa, channel)
+            hops.append((rs_sa, address, None))
+
+        bridged = pyipmi.Target(address, hops)
+        ipmi = pyipmi.Ipmi(interface=self._ipmi.interface,
+                session=self._ipmi.session, target=bridged)
+        ipmi.requester = self._ipmi.requester
+        connection = IpmiConnection(ipmi, bridged)
+        if 'unit_address' in self._cp:
+            connection._properties['unit_address'] = self._cp['unit_address']
+        return connection
+
+    def run_keyword_on_ipmi_connections(self, connections, keyword, *args,
+            max_workers=8):
+        """Runs a keyword of this library on several connections at once.
+
+        `connections` is a list of connection indexes or aliases, or `ALL`
+        for all connections. The keyword is run with the given `args` in a
+        pool of at most `max_workers` threads, each using one of the
+        connections as its active connection.
+
+        A dictionary is returned which maps each index or alias to a tuple
+        of the status (`PASS` or `FAIL`) and the return value or the error
+        message, like the `Run Keyword And Ignore Error` keyword of the
+        BuiltIn library.
+
+        Example:
+        | ${results}= | Run Keyword On IPMI Connections | ${blades} | Get BMC Device Id |
+        | ${results}= | Run Keyword On IPMI Connections | ALL | Send Raw Command | 0x06 | 0x01 |
+        """
+
+        if isinstance(connections, str):
+            if connections.upper() == 'ALL':
+                connections = range(1, len(self._cache) + 1)
+            else:
+                connections = [connections]
+
+        name = keyword.strip().lower().replace(' ', '_')
+        method = getattr(self, name, None)
+        if name.startswith('_') or not callable(method):
+            raise RuntimeError('No keyword "%s" found' % keyword)
+
+        futures = {}
+        with ThreadPoolExecutor(max_workers=int_any_base(max_workers)) as pool:
+            for alias in connections:
+                connection = self._cache.get_connection(alias)
+                futures[alias] = pool.submit(self._run_keyword_on_connection,
+                        connection, method, args)
+
+        results = {}
+        for (alias, future) in futures.items():
+            try:
+                results[alias] = ('PASS', future.result())
+            except Exception as e:
+                results[alias] = ('FAIL', str(e))
+        return results
+
     def wait_until_connection_is_ready(self):
         """*DEPRECATED*"""
         start_time = time.time()
@@ -264,6 +445,100 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
             raise AssertionError('return code was %d' % rc)
         return output
 
+    def _instrumented_interface(self, connection=None):
+        if connection is None:
+            connection = self._active_connection
+        interface = connection._ipmi.interface
+        while isinstance(interface, InterfaceWrapper):
+            if isinstance(interface, InstrumentedInterface):
+                return interface
+            interface = interface._interface
+        raise RuntimeError('Connection has no statistics')
+
+    def get_ipmi_statistics(self):
+        """Returns the statistics of the requests sent over the active
+        connection.
+
+        A dictionary is returned which maps the name of each command (e.g.
+        `GetSensorReading (04h/2Dh)`) to a dictionary with the following
+        keys:
+        - `count`: number of requests
+        - `retries`: requests answered with Node Busy or not answered
+        - `timeouts`: requests not answered
+        - `errors`: requests which failed otherwise
+        - `completion_codes`: number of responses per completion code
+        - `min`, `mean`, `p50`, `p99`, `max`: latency in seconds
+
+        Example:
+        | ${stats}= | Get IPMI Statistics |
+        | Should Be True | ${stats['GetSensorReading (04h/2Dh)']['p99']} < 0.1 |
+        """
+        interface = self._instrumented_interface()
+        with interface._lock:
+            statistics = list(interface.statistics.values())
+            return dict((stats.name, stats.as_dict())
+                    for stats in statistics)
+
+    def reset_ipmi_statistics(self):
+        """Clears the statistics of the active connection."""
+        self._instrumented_interface().reset()
+
+    def _log_ipmi_statistics(self, index, connection):
+        interface = self._instrumented_interface(connection)
+        with interface._lock:
+            statistics = sorted(interface.statistics.values(),
+                    key=lambda stats: stats.latencies.total, reverse=True)
+            lines = ['IPMI statistics of connection %d:' % index]
+            for stats in statistics:
+                d = stats.as_dict()
+                if d['p50'] is None:
+                    latency = '-'
+                else:
+                    latency = 'p50 %.1f ms, p99 %.1f ms, max %.1f ms' % (
+                            d['p50'] * 1000, d['p99'] * 1000,
+                            d['max'] * 1000)
+                lines.append('%s: %d requests, %d retries, %s'
+                        % (stats.name, d['count'], d['retries'], latency))
+        self._info('\n'.join(lines))
+
+    def _reconnecting_interface(self):
+        interface = self._ipmi.interface
+        if not isinstance(interface, ReconnectingInterface):
+            raise RuntimeError('Connection does not support reconnects')
+        return interface
+
+    def set_session_keepalive_interval(self, interval):
+        """Keeps the session of the active LAN connection alive.
+
+        If no request was sent for `interval` (given in Robot Framework's
+        time format), a Get Device ID request is sent to the BMC. If it
+        is not answered, the session is established again. An interval of
+        0 stops the keepalive. RMCP connections are opened with the
+        keepalive interval of pyipmi, 1 second.
+
+        Example:
+        | Set Session Keepalive Interval | 20 seconds |
+        """
+        interval = robottime.timestr_to_secs(interval)
+        self._reconnecting_interface().start_keepalive(interval)
+
+    def get_session_reconnects(self):
+        """Returns the reconnects of the session of the active LAN
+        connection.
+
+        A list of dictionaries with the keys `time` (seconds since the
+        epoch), `reason` (the error which revealed the lost session),
+        `duration` (seconds needed to establish the session again) and
+        `error` (why establishing the session failed, `None` on success)
+        is returned. Failed reconnects of the keepalive are also logged as
+        warnings.
+
+        Example:
+        | ${reconnects}= | Get Session Reconnects |
+        | Length Should Be | ${reconnects} | 0 |
+        """
+        return list(self._reconnecting_interface().reconnects)
+
     def set_timeout(self, timeout):
         """Sets the timeout used in `Wait Until X` keywords to the given value.
 
@@ -297,6 +572,63 @@ class IpmiLibrary(Sdr, Sel, Fru, Bmc, Picmg, Hpm, Chassis, Lan):
         self._poll_interval = robottime.timestr_to_secs(poll_interval)
         return robottime.secs_to_timestr(old)
 
+    def set_cache_directory(self, cache_dir=None):
+        """Sets the directory where SDR lists and FRU data are cached.
+
+        The cached data is keyed by the manufacturer id, product id,
+        firmware revision and device GUID of the device and, for SDRs, the
+        SDR source timestamps. Without a device GUID, the host and port of
+        the LAN connection or the Aardvark adapter are used instead. Other
+        suites or parallel processes using the same directory can load the
+        data instead of reading it from the device.
+
+        FRU data is only cached by `Prefetch FRU Data`. Changes to the FRU
+        data that are not done by `Write FRU Data` are not detected. If the
+        unit cannot be identified, FRU data is not cached.
+
+        If `cache_dir` is not given, the cache is disabled. The old
+        directory is returned.
+
+        The directory can also be set when importing the library.
+        """
+
+        old = None
+        if self._file_cache is not None:
+            old = self._file_cache.directory
+        if cache_dir is None:
+            self._file_cache = None
+        else:
+            self._file_cache = FileCache(cache_dir)
+        return old
+
+    def _device_unit_id(self):
+        """Returns an identity of the unit behind the active connection.
+
+        This is the device GUID of the controller or, if it has none, the
+        address of the connection (LAN host and port or Aardvark adapter).
+        Devices of the same product and firmware differ in their FRU data,
+        so the data of one unit must not be used for another one. None is
+        returned if the unit cannot be identified.
+        """
+        if 'unit_id' not in self._cp:
+            try:
+                unit_id = self._ipmi.get_device_guid().device_guid_string
+            except CompletionCodeError:
+                unit_id = self._cp.get('unit_address')
+            self._cp['unit_id'] = unit_id
+        return self._cp['unit_id']
+
+    def _device_cache_key(self, *args):
+        """Returns a key identifying the device of the active connection
+        for the file cache, extended by `args`.
+        """
+        device_id = self._ipmi.get_device_id()
+        target = self._ipmi.target
+        return (device_id.manufacturer_id, device_id.product_id,
+                str(device_id.fw_revision), self._device_unit_id(),
+                target.ipmb_address,
+                repr(getattr(target, 'routing', None))) + args
+
     def send_raw_command(self, *data):
         """Sends a raw IPMI command.
 
@@ -0,0 +1,104 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import struct
+import tempfile
+
+import pyipmi.sdr
+
+
+class FileCache(object):
+    """Stores SDR lists and FRU data in a directory.
+
+    Every entry is a file whose name is derived from a key tuple, which
+    identifies the device and the state of the data (e.g. manufacturer id,
+    product id, firmware revision, device GUID and the SDR repository
+    timestamps). An entry is never updated, a changed device results in a
+    new key.
+
+    SDR lists are stored as a sequence of length prefixed raw records, FRU
+    data as raw bytes. Files are written atomically, so several processes
+    (e.g. parallel pabot workers) can share one directory.
+    """
+
+    SDR_MAGIC = b'IPMISDR1'
+    FRU_MAGIC = b'IPMIFRU1'
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, kind, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, '%s-%s.bin' % (kind, digest))
+
+    def _read(self, kind, key, magic):
+        try:
+            with open(self._path(kind, key), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        if not data.startswith(magic):
+            return None
+        return data[len(magic):]
+
+    def _write(self, kind, key, magic, data):
+        (fd, tmp) = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(magic)
+                f.write(data)
+            os.replace(tmp, self._path(kind, key))
+        except (IOError, OSError):
+            os.unlink(tmp)
+            raise
+
+    def load_sdr_list(self, key):
+        """Returns the SDR list stored for `key` or `None`."""
+        data = self._read('sdr', key, self.SDR_MAGIC)
+        if data is None:
+            return None
+        sdrs = []
+        offset = 0
+        while offset < len(data):
+            (length,) = struct.unpack_from('<H', data, offset)
+            offset += 2
+            sdrs.append(pyipmi.sdr.SdrCommon.from_data(
+                    bytearray(data[offset:offset+length])))
+            offset += length
+        return sdrs
+
+    def store_sdr_list(self, key, sdrs):
+        chunks = []
+        for sdr in sdrs:
+            record = bytes(bytearray(sdr.data))
+            chunks.append(struct.pack('<H', len(record)))
+            chunks.append(record)
+        self._write('sdr', key, self.SDR_MAGIC, b''.join(chunks))
+
+    def load_fru_data(self, key):
+        """Returns the FRU data stored for `key` or `None`."""
+        return self._read('fru', key, self.FRU_MAGIC)
+
+    def store_fru_data(self, key, data):
+        self._write('fru', key, self.FRU_MAGIC, bytes(bytearray(data)))
+
+    def remove_fru_data(self, key):
+        try:
+            os.unlink(self._path('fru', key))
+        except OSError:
+            pass
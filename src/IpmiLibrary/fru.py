@@ -16,30 +16,417 @@ import array
 
 from robot.utils import asserts
 import pyipmi
+import pyipmi.msgs
+from pyipmi.errors import CompletionCodeError
+from pyipmi.msgs import constants
 
 from .utils import int_any_base
 from .mapping import *
 
+# the response to a Read FRU Data request has to fit into one IPMI message
+MAX_FRU_READ_COUNT = 0xf0
+
+# reads up to this size are sent without probing the FRU device first
+SMALL_FRU_READ_COUNT = 32
+
+# completion codes telling that less bytes have to be requested at once
+FRU_READ_BACKOFF_CODES = (
+    constants.CC_REQ_DATA_INV_LENGTH,
+    constants.CC_REQ_DATA_FIELD_EXCEED,
+    constants.CC_PARAM_OUT_OF_RANGE,
+    constants.CC_CANT_RET_NUM_REQ_BYTES,
+)
+
+
+
+def _fru_write_ranges(old, new, max_length):
+    """Returns the (offset, length) tuples of the writes which change the
+    FRU data `old` into `new`.
+
+    Runs of changed bytes are merged into one write as long as it does not
+    exceed `max_length` bytes, longer runs are split.
+    """
+    BLOCK = 64
+    runs = []
+    i = 0
+    while i < len(new):
+        if old[i:i+BLOCK] == new[i:i+BLOCK]:
+            i += BLOCK
+            continue
+        end = min(i + BLOCK, len(new))
+        while i < end:
+            if old[i] == new[i]:
+                i += 1
+                continue
+            start = i
+            while i < len(new) and old[i] != new[i]:
+                i += 1
+            runs.append((start, i))
+            end = max(end, i)
+
+    ranges = []
+    for (start, end) in runs:
+        if ranges and end - ranges[-1][0] <= max_length:
+            ranges[-1] = (ranges[-1][0], end)
+            continue
+        while end - start > max_length:
+            ranges.append((start, start + max_length))
+            start += max_length
+        ranges.append((start, end))
+    return [(start, end - start) for (start, end) in ranges]
+
+
+class LazyFruInventory(object):
+    """A FRU inventory which reads and decodes its areas on first use.
+
+    `read(offset, length)` returns FRU data and `size()` the size of the
+    FRU data. Accessing an area reads the common header and the area only,
+    the decoded area is kept. The attributes are the same as those of
+    `pyipmi.fru.FruInventory`.
+
+    The records of the multirecord area are indexed by the record type and
+    the PICMG record type, see `find_multirecords`.
+    """
+
+    def __init__(self, read, size):
+        self._read = read
+        self._size = size
+        self._areas = {}
+        self._multirecord_index = None
+
+    def _cached(self, name, decode):
+        if name not in self._areas:
+            self._areas[name] = decode()
+        return self._areas[name]
+
+    @property
+    def common_header(self):
+        return self._cached('common_header', lambda:
+                pyipmi.fru.InventoryCommonHeader(self._read(0, 8)))
+
+    def _area_end(self, offset):
+        end = self.common_header.next_area_offset(offset)
+        if end is None:
+            end = self._size()
+        return end
+
+    def _info_area(self, offset, cls):
+        if offset is None:
+            return None
+        # the area header holds the length of the area in multiples of 8
+        header = bytes(self._read(offset, 2))
+        length = header[1] * 8
+        return cls(header[:length]
+                + bytes(self._read(offset + 2, max(length - 2, 0))))
+
+    @property
+    def internal_use_area(self):
+        def decode():
+            offset = self.common_header.internal_use_area_offset
+            if offset is None:
+                return None
+            return pyipmi.fru.InventoryInternalUseArea(
+                    self._read(offset, self._area_end(offset) - offset))
+        return self._cached('internal_use_area', decode)
+
+    @property
+    def chassis_info_area(self):
+        return self._cached('chassis_info_area', lambda: self._info_area(
+                self.common_header.chassis_info_area_offset,
+                pyipmi.fru.InventoryChassisInfoArea))
+
+    @property
+    def board_info_area(self):
+        return self._cached('board_info_area', lambda: self._info_area(
+                self.common_header.board_info_area_offset,
+                pyipmi.fru.InventoryBoardInfoArea))
+
+    @property
+    def product_info_area(self):
+        return self._cached('product_info_area', lambda: self._info_area(
+                self.common_header.product_info_area_offset,
+                pyipmi.fru.InventoryProductInfoArea))
+
+    @property
+    def multirecord_area(self):
+        def decode():
+            offset = self.common_header.multirecord_area_offset
+            if offset is None:
+                return None
+            return pyipmi.fru.InventoryMultiRecordArea(
+                    self._read(offset, self._area_end(offset) - offset))
+        return self._cached('multirecord_area', decode)
+
+    def find_multirecords(self, record_type_id, picmg_record_type_id=None):
+        """Returns the multirecords with the given record type and, for
+        PICMG records, PICMG record type."""
+        if self._multirecord_index is None:
+            index = {}
+            area = self.multirecord_area
+            for record in (area.records if area is not None else ()):
+                key = (record.record_type_id,
+                        getattr(record, 'picmg_record_type_id', None))
+                index.setdefault(key, []).append(record)
+            self._multirecord_index = index
+        return list(self._multirecord_index.get(
+                (record_type_id, picmg_record_type_id), ()))
+
+
 class Fru:
     def _fru_data(self, fru_id):
         if ('prefetched_fru_data' in self._cp
                 and fru_id in self._cp['prefetched_fru_data']):
             return self._cp['prefetched_fru_data'][fru_id]
         else:
-            return self._ipmi.read_fru_data(fru_id=fru_id)
+            return self._read_fru(fru_id)
+
+    def _send_fru_reads(self, fru_id, chunks):
+        """Sends a Read FRU Data request for each (offset, count) tuple of
+        `chunks` and returns the (completion code, data) tuples.
+
+        If the interface supports it, all requests are sent at once.
+        """
+        reqs = []
+        for (offset, count) in chunks:
+            req = pyipmi.msgs.create_request_by_name('ReadFruData')
+            req.fru_id = fru_id
+            req.offset = offset
+            req.count = count
+            reqs.append(req)
+
+        results = []
+        for rsp in self._send_messages(reqs):
+            if rsp.completion_code != constants.CC_OK:
+                results.append((rsp.completion_code, b''))
+            else:
+                results.append((constants.CC_OK,
+                        bytes(rsp.data)[:rsp.count]))
+        return results
+
+    def _fru_read_count(self, fru_id, length):
+        """Returns the number of bytes to request per Read FRU Data request
+        for reading `length` bytes, at most the largest count the FRU device
+        supports.
+
+        The largest count is found by bisecting with reads from the start of
+        the FRU data and is cached per connection. The first read requests
+        `SMALL_FRU_READ_COUNT` bytes, which every FRU device should accept,
+        so its errors are raised. Devices reject larger counts with various
+        completion codes, every error is taken as a too large count then.
+        Small reads are sent as they are, they are split if the FRU device
+        rejects them.
+        """
+        counts = self._cp.setdefault('fru_read_counts', {})
+        if fru_id in counts:
+            return counts[fru_id]
+        if length <= SMALL_FRU_READ_COUNT:
+            return length
+
+        good = 0
+        bad = MAX_FRU_READ_COUNT + 1
+        count = SMALL_FRU_READ_COUNT
+        while True:
+            [(cc, data)] = self._send_fru_reads(fru_id, [(0, count)])
+            if cc == constants.CC_OK:
+                good = count
+            elif (cc in FRU_READ_BACKOFF_CODES
+                    or count > SMALL_FRU_READ_COUNT):
+                bad = count
+            else:
+                raise CompletionCodeError(cc)
+            if good >= length or bad - good <= 1:
+                break
+            if bad > MAX_FRU_READ_COUNT:
+                count = min(MAX_FRU_READ_COUNT, length)
+            else:
+                count = (good + bad) // 2
+
+        if good == 0:
+            raise CompletionCodeError(cc)
+        if bad - good <= 1:
+            counts[fru_id] = good
+        return good
+
+    def _read_fru(self, fru_id, offset=None, count=None):
+        """Reads `count` bytes of FRU data starting at `offset`, the whole
+        FRU data if they are not given.
+
+        The data is read in chunks of the largest size the FRU device
+        supports, several at once if the interface allows it. A chunk
+        rejected because of its size is split and read again.
+        """
+        if offset is None or count is None:
+            offset = offset or 0
+            end = self._ipmi.get_fru_inventory_area_info(fru_id)
+        else:
+            end = offset + count
+
+        data = bytearray(max(end - offset, 0))
+        if not data:
+            return bytes(data)
+        chunk_size = self._fru_read_count(fru_id, end - offset)
+        chunks = [(o, min(chunk_size, end - o))
+                for o in range(offset, end, chunk_size)]
+        while chunks:
+            missing = []
+            for ((o, n), (cc, chunk)) in zip(chunks,
+                    self._send_fru_reads(fru_id, chunks)):
+                if cc in FRU_READ_BACKOFF_CODES and n > 1:
+                    # only a rejected chunk of the full size shows that the
+                    # chunk size is too large, a shorter one (e.g. at the
+                    # end of the FRU data) may be rejected for its offset
+                    if n == chunk_size:
+                        chunk_size = n // 2
+                        self._cp['fru_read_counts'][fru_id] = chunk_size
+                    missing.append((o, n // 2))
+                    missing.append((o + n // 2, n - n // 2))
+                    continue
+                elif cc != constants.CC_OK:
+                    raise CompletionCodeError(cc)
+                elif not chunk:
+                    raise RuntimeError('FRU device %d returned no data at '
+                            'offset 0x%04x' % (fru_id, o))
+                chunk = chunk[:n]
+                data[o - offset:o - offset + len(chunk)] = chunk
+                if len(chunk) < n:
+                    missing.append((o + len(chunk), n - len(chunk)))
+            chunks = missing
+        return bytes(data)
+
+    def _fru_inventory(self, fru_id):
+        """Returns the FRU inventory of the given `fru_id`.
+
+        The areas of the inventory are decoded on first use, reading only
+        the common header and the area if the FRU data is not prefetched.
+        The inventory is cached per connection until the FRU data is
+        prefetched or written again.
+        """
+        if 'fru_inventories' not in self._cp:
+            self._cp['fru_inventories'] = {}
+        inventories = self._cp['fru_inventories']
+        if fru_id not in inventories:
+            if ('prefetched_fru_data' in self._cp
+                    and fru_id in self._cp['prefetched_fru_data']):
+                data = self._cp['prefetched_fru_data'][fru_id]
+                inventories[fru_id] = LazyFruInventory(
+                        lambda offset, length: self._fru_view(fru_id, offset,
+                                length),
+                        lambda: len(data))
+            else:
+                inventories[fru_id] = LazyFruInventory(
+                        lambda offset, length: self._read_fru(fru_id, offset,
+                                length),
+                        lambda: self._ipmi.get_fru_inventory_area_info(fru_id))
+        return inventories[fru_id]
+
+    def _invalidate_fru_inventory(self, fru_id):
+        if ('fru_inventories' in self._cp
+                and fru_id in self._cp['fru_inventories']):
+            del self._cp['fru_inventories'][fru_id]
 
     def prefetch_fru_data(self, fru_id=0):
         """Fetches the FRU data of the given `fru_id`.
 
         After prefetching the FRU data, all further operations will use this
         cached data. Note that every connection has its own cache.
+
+        The FRU data is read with the largest Read FRU Data count the FRU
+        device accepts. Interfaces which can have several requests in
+        flight (e.g. `pipelinedrmcp`) read the chunks at once.
         """
 
         fru_id = int(fru_id)
+        self._invalidate_fru_inventory(fru_id)
         if 'prefetched_fru_data' not in self._cp:
             self._cp['prefetched_fru_data'] = {}
         self._cp['prefetched_fru_data'][fru_id] = \
-                self._ipmi.read_fru_data(fru_id=fru_id)
+                self._read_cached_fru_data(fru_id)
+
+    def discover_fru_inventory(self):
+        """Reads all logical FRU devices listed in the SDR list of the
+        active connection.
+
+        The FRU devices are taken from the FRU Device Locator records of the
+        SDR list. On a shelf manager these are the FRU devices of all IPM
+        controllers of the shelf. The FRU devices of other controllers are
+        read by bridging the requests through the controller of the active
+        connection. The FRU devices are read one after the other, the reads
+        of each FRU device are pipelined if the interface supports it. Use
+        `Run Keyword On IPMI Connections` to discover several shelves in
+        parallel.
+
+        The FRU data of the controller of the active connection is
+        prefetched, like by `Prefetch FRU Data`. A dictionary is returned
+        which maps each (controller address, FRU device id) tuple to a
+        dictionary with the keys `name`, `entity_id`, `entity_instance` and
+        the parsed `inventory`. FRU devices which cannot be read are left
+        out with a warning.
+
+        Example:
+        | ${frus}= | Discover FRU Inventory |
+        | ${board}= | Evaluate | $frus[(0x82, 0)]['inventory'].board_info_area |
+        """
+
+        locators = {}
+        for sdr in self._sdr_list.find_by_record_type(
+                pyipmi.sdr.SDR_TYPE_FRU_DEVICE_LOCATOR_RECORD):
+            if not sdr.logical_physical & 0x80:
+                continue
+            locators.setdefault(
+                    (sdr.device_access_address << 1, sdr.fru_device_id), sdr)
+
+        own_address = self._ipmi.target.ipmb_address
+        connections = {}
+        inventories = {}
+        self._cp.setdefault('prefetched_fru_data', {})
+        for ((address, fru_id), sdr) in sorted(locators.items()):
+            try:
+                if address == own_address:
+                    data = self._read_cached_fru_data(fru_id)
+                else:
+                    if address not in connections:
+                        connections[address] = self._bridged_connection(
+                                address, sdr.channel_number >> 4)
+                    data = self._run_keyword_on_connection(
+                            connections[address], self._read_cached_fru_data,
+                            (fru_id,))
+                inventory = pyipmi.fru.FruInventory(data)
+            except Exception as e:
+                self._warn('Reading FRU %d "%s" of controller %02Xh failed: %s'
+                        % (fru_id, sdr.device_id_string, address, e))
+                continue
+            if address == own_address:
+                self._invalidate_fru_inventory(fru_id)
+                self._cp['prefetched_fru_data'][fru_id] = data
+            inventories[(address, fru_id)] = {
+                'name': sdr.device_id_string,
+                'entity_id': sdr.entity_id,
+                'entity_instance': sdr.entity_instance,
+                'inventory': inventory,
+            }
+        return inventories
+
+    def _fru_cache_key(self, fru_id):
+        """Returns the file cache key of the FRU data, None if there is no
+        file cache or the unit cannot be identified."""
+        if self._file_cache is None or self._device_unit_id() is None:
+            return None
+        area_size = self._ipmi.get_fru_inventory_area_info(fru_id)
+        return self._device_cache_key('fru', fru_id, area_size)
+
+    def _read_cached_fru_data(self, fru_id):
+        """Reads the FRU data, from the file cache if possible."""
+        key = self._fru_cache_key(fru_id)
+        if key is None:
+            return self._read_fru(fru_id)
+
+        data = self._file_cache.load_fru_data(key)
+        if data is None:
+            data = self._read_fru(fru_id)
+            self._file_cache.store_fru_data(key, data)
+        else:
+            self._info('FRU data loaded from %s' % self._file_cache.directory)
+        return data
 
     def get_fru_inventory_area_size(self, fru_id=0):
         """Returns the FRU Inventory Area Info size.
@@ -59,9 +446,7 @@ class Fru:
         fru_id = int(fru_id)
         offset = int_any_base(offset)
         count = int_any_base(count)
-        data_string = self._ipmi.read_fru_data(offset, count, fru_id)
-        data = [ord(c) for c in data_string]
-        return data
+        return list(self._read_fru(fru_id, offset, count))
 
     def write_fru_data(self, offset, data, fru_id=0):
         """Writes data bytes to FRU data area.
@@ -73,7 +458,7 @@ class Fru:
 
         fru_id = int(fru_id)
         offset = int_any_base(offset)
-        if isinstance(data, basestring):
+        if isinstance(data, str):
             data = [int_any_base(d) for d in data.split(' ')]
         elif isinstance(data, list):
             data = data
@@ -82,6 +467,91 @@ class Fru:
         data = array.array('B', data)
         self._ipmi.write_fru_data(data, offset, fru_id)
 
+        self._invalidate_fru_inventory(fru_id)
+        if ('prefetched_fru_data' in self._cp
+                and fru_id in self._cp['prefetched_fru_data']):
+            prefetched = memoryview(self._cp['prefetched_fru_data'][fru_id])
+            self._cp['prefetched_fru_data'][fru_id] = b''.join((
+                    prefetched[:offset], data.tobytes(),
+                    prefetched[offset+len(data):]))
+        key = self._fru_cache_key(fru_id)
+        if key is not None:
+            self._file_cache.remove_fru_data(key)
+
+    def write_fru_image(self, image, fru_id=0):
+        """Writes a FRU image, sending only the bytes which differ from
+        the current FRU data.
+
+        `image` is either the image data or the name of a file containing
+        it. The image is compared with the prefetched FRU data or, if there
+        is none, with the FRU data read from the device. The changed bytes
+        are written with as few Write FRU Data requests as possible, read
+        back and verified. The prefetched FRU data is updated afterwards.
+
+        The number of write requests is returned.
+
+        Example:
+        | Prefetch FRU Data | 0 |
+        | ${image}= | FRU Data Get Inventory | 0 |
+        | Write FRU Data | 0x40 | 0x41 0x42 |
+        | Write FRU Image | ${image} | 0 |
+        """
+
+        fru_id = int_any_base(fru_id)
+        if isinstance(image, str):
+            with open(image, 'rb') as f:
+                image = f.read()
+        image = bytes(image)
+
+        old = self._fru_data(fru_id)
+        if len(image) > len(old):
+            raise RuntimeError('FRU image has %d bytes, but FRU %d has only '
+                    '%d bytes' % (len(image), fru_id, len(old)))
+
+        ranges = _fru_write_ranges(old, image, self._ipmi.write_length)
+        for (offset, length) in ranges:
+            rsp = self._ipmi.send_message_by_name('WriteFruData',
+                    fru_id=fru_id, offset=offset,
+                    data=image[offset:offset+length])
+            if rsp.count_written != length:
+                raise AssertionError('Wrote %d bytes at offset 0x%04x of FRU '
+                        '%d, but device wrote %d bytes' % (length, offset,
+                        fru_id, rsp.count_written))
+
+        # read back the written ranges, merged into as few reads as possible
+        read_ranges = _fru_write_ranges(old, image,
+                self._cp.get('fru_read_counts', {}).get(fru_id,
+                self._ipmi.write_length))
+        for (offset, length) in read_ranges:
+            data = self._read_fru(fru_id, offset, length)
+            if data != image[offset:offset+length]:
+                raise AssertionError('FRU %d data at offset 0x%04x does not '
+                        'match the image after writing' % (fru_id, offset))
+
+        self._info('Wrote %d ranges of FRU %d' % (len(ranges), fru_id))
+        if ranges:
+            data = image + old[len(image):]
+            self._invalidate_fru_inventory(fru_id)
+            if ('prefetched_fru_data' in self._cp
+                    and fru_id in self._cp['prefetched_fru_data']):
+                self._cp['prefetched_fru_data'][fru_id] = data
+            key = self._fru_cache_key(fru_id)
+            if key is not None:
+                self._file_cache.store_fru_data(key, data)
+        return len(ranges)
+
+    def _fru_view(self, fru_id, offset, length):
+        """Returns a memoryview of `length` bytes of FRU data at `offset`.
+
+        Prefetched FRU data is not copied. Otherwise only the requested
+        bytes are read from the FRU device.
+        """
+        if ('prefetched_fru_data' in self._cp
+                and fru_id in self._cp['prefetched_fru_data']):
+            data = self._cp['prefetched_fru_data'][fru_id]
+            return memoryview(data)[offset:offset+length]
+        return memoryview(self._read_fru(fru_id, offset, length))
+
     def fru_data_at_offset_should_be(self, offset, expected_data, fru_id=0,
             msg=None):
         """Fails unless the FRU data contains the expected data at the given
@@ -89,15 +559,12 @@ class Fru:
 
         fru_id = int(fru_id)
         offset = int_any_base(offset)
-        expected_data = [int_any_base(d) for d in expected_data.split(' ')]
+        expected_data = bytes(int_any_base(d)
+                for d in expected_data.split(' '))
 
-        data = self._fru_data(fru_id)[offset:offset+len(expected_data)]
-
-        # convert to common data structure
-        data = array.array('B', data)
-        expected_data = array.array('B', expected_data)
-
-        asserts.assert_equal(expected_data, data, msg)
+        data = self._fru_view(fru_id, offset, len(expected_data))
+        if data != expected_data:
+            asserts.assert_equal(list(expected_data), data.tolist(), msg)
 
     def fru_data_tlv_at_offset_should_be(self, offset, expected_type,
                 expected_length, expected_data, fru_id=0, msg=None):
@@ -112,17 +579,17 @@ class Fru:
         # XXX: refactor this, pyipmi already has code for decoding TLVs
         if expected_type == 0:
             # binary
-            expected_data = [int_any_base(d) for d in expected_data.split(' ')]
+            expected_data = bytes(int_any_base(d)
+                    for d in expected_data.split(' '))
         else:
-            expected_data = str(expected_data)
-        expected_data = array.array('B', expected_data)
+            expected_data = str(expected_data).encode('latin-1')
 
-        tlv = array.array('B',
-                self._fru_data(fru_id)[offset:offset+len(expected_data)+1])
+        tlv = self._fru_view(fru_id, offset, len(expected_data) + 1)
 
         asserts.assert_equal(expected_type, (tlv[0] >> 6) & 0x3, msg)
         asserts.assert_equal(expected_length, tlv[0] & 0x3f, msg)
-        asserts.assert_equal(expected_data, tlv[1:], msg)
+        if tlv[1:] != expected_data:
+            asserts.assert_equal(list(expected_data), tlv[1:].tolist(), msg)
 
     def fru_data_get_inventory(self, fru_id=0):
         """Return the Fru Data for the given fru_id.
@@ -134,7 +601,7 @@ class Fru:
         """Returns the Board Manufacturer.
         """
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
+        fru = self._fru_inventory(fru_id)
         return str(fru.board_info_area.manufacturer)
 
     def fru_data_board_manufacturer_should_be(self, expected_value, fru_id=0):
@@ -147,7 +614,7 @@ class Fru:
         """Returns the Board Product Name.
         """
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
+        fru = self._fru_inventory(fru_id)
         return str(fru.board_info_area.product_name)
 
     def fru_data_board_product_name_should_be(self, expected_value, fru_id=0):
@@ -160,7 +627,7 @@ class Fru:
         """Returns the Board Serial Number.
         """
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
+        fru = self._fru_inventory(fru_id)
         return str(fru.board_info_area.serial_number)
 
     def fru_data_board_serial_number_should_be(self, expected_value, fru_id=0):
@@ -173,7 +640,7 @@ class Fru:
         """Returns the Board Part Number.
         """
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
+        fru = self._fru_inventory(fru_id)
         return str(fru.board_info_area.part_number)
 
     def fru_data_board_part_number_should_be(self, expected_value, fru_id=0):
@@ -186,7 +653,7 @@ class Fru:
         """Returns the Product Manufacturer.
         """
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
+        fru = self._fru_inventory(fru_id)
         return str(fru.product_info_area.manufacturer)
 
     def fru_data_product_manufacturer_should_be(self, expected_value, fru_id=0):
@@ -199,7 +666,7 @@ class Fru:
         """Returns the Product Name.
         """
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
+        fru = self._fru_inventory(fru_id)
         return str(fru.product_info_area.name)
 
     def fru_data_product_name_should_be(self, expected_value, fru_id=0):
@@ -212,7 +679,7 @@ class Fru:
         """Returns the Product Part Number.
         """
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
+        fru = self._fru_inventory(fru_id)
         return str(fru.product_info_area.part_number)
 
     def fru_data_product_part_number_should_be(self, expected_value, fru_id=0):
@@ -231,14 +698,12 @@ class Fru:
         record_type = find_picmg_multirecord_id(record_type)
         index = int_any_base(index)
         fru_id = int_any_base(fru_id)
-        fru = pyipmi.fru.FruInventory(self._fru_data(fru_id))
-
-        found_num = 0
-        for record in fru.multirecord_area.records:
-            if ((record.record_type_id, record.picmg_record_type_id) ==
-                (pyipmi.fru.FruDataMultiRecord.TYPE_OEM_PICMG, record_type)):
-                if found_num == index:
-                    return record
+        fru = self._fru_inventory(fru_id)
+
+        records = fru.find_multirecords(
+                pyipmi.fru.FruDataMultiRecord.TYPE_OEM_PICMG, record_type)
+        if 0 <= index < len(records):
+            return records[index]
 
         raise AssertionError('Record type %s index=%s not found for fru_id=%s'
                  % (record_type, index, fru_id))
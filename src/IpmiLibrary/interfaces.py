@@ -0,0 +1,466 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+
+import pyipmi
+import pyipmi.interfaces
+import pyipmi.msgs
+from pyipmi.msgs import constants
+from pyipmi.msgs.registry import DEFAULT_REGISTRY
+from pyipmi.errors import RetryError, IpmiTimeoutError, IpmiConnectionError
+
+from .ipmitoolshell import IpmitoolShell
+from .pipelinedrmcp import PipelinedRmcp
+from .statistics import CommandStatistics
+from .trace import (TraceWriter, ReplayInterface, STATUS_OK, STATUS_TIMEOUT,
+        STATUS_ERROR)
+
+logger = logging.getLogger(__name__)
+
+
+def _raw_command_key(netfn, raw_bytes):
+    """Returns the (netfn, cmdid, group extension) of a raw request."""
+    group_extension = None
+    if netfn == constants.NETFN_GROUP_EXTENSION and len(raw_bytes) > 1:
+        group_extension = raw_bytes[1]
+    return (netfn, raw_bytes[0], group_extension)
+
+
+class InterfaceWrapper(object):
+    """Base class for wrappers around a pyipmi interface.
+
+    All attributes which are not overridden are forwarded to the wrapped
+    interface, so a wrapper can be passed to `pyipmi.Ipmi` instead of the
+    interface itself.
+
+    `send_and_receive_many` is only provided if the wrapped interface has
+    it, wrappers override `_send_and_receive_many` instead.
+    """
+
+    def __init__(self, interface):
+        self._interface = interface
+
+    def __getattr__(self, name):
+        if name == 'send_and_receive_many':
+            # raises AttributeError if the interface can't send at once
+            getattr(self._interface, name)
+            return self._send_and_receive_many
+        return getattr(self._interface, name)
+
+    def _send_and_receive_many(self, reqs):
+        return self._interface.send_and_receive_many(reqs)
+
+    def send_and_receive(self, req):
+        return self._interface.send_and_receive(req)
+
+    def send_and_receive_raw(self, target, lun, netfn, raw_bytes):
+        return self._interface.send_and_receive_raw(target, lun, netfn,
+                raw_bytes)
+
+
+class SynchronizedInterface(InterfaceWrapper):
+    """Serializes the requests sent over an interface.
+
+    The pyipmi interfaces handle one request at a time. This wrapper allows
+    several threads (e.g. the sensor sampler) to share one connection.
+    """
+
+    def __init__(self, interface):
+        InterfaceWrapper.__init__(self, interface)
+        self.lock = threading.RLock()
+
+    def send_and_receive(self, req):
+        with self.lock:
+            return self._interface.send_and_receive(req)
+
+    def send_and_receive_raw(self, target, lun, netfn, raw_bytes):
+        with self.lock:
+            return self._interface.send_and_receive_raw(target, lun, netfn,
+                    raw_bytes)
+
+    def _send_and_receive_many(self, reqs):
+        with self.lock:
+            return self._interface.send_and_receive_many(reqs)
+
+    def is_target_accessible(self, target):
+        with self.lock:
+            return self._interface.is_target_accessible(target)
+
+    def is_ipmc_accessible(self, target):
+        with self.lock:
+            return self._interface.is_ipmc_accessible(target)
+
+
+class ReconnectingInterface(SynchronizedInterface):
+    """Re-establishes a lost session.
+
+    If a request fails with a timeout, the BMC is asked for its device ID.
+    If it does not answer either, the session is considered lost and it is
+    established again. Idempotent requests (see `IDEMPOTENT_COMMANDS`) are
+    then retried once. Others (e.g. Write FRU Data or Clear SEL) may have
+    been executed before the session was lost, their error is raised.
+    Every reconnect is recorded in `reconnects`.
+
+    A keepalive thread sends a Get Device ID request to the BMC if the
+    connection was idle for `interval` seconds, so the session does not
+    time out e.g. during a long sleep. It replaces the keepalive of the
+    pyipmi RMCP interface, which does not establish a lost session again,
+    and is started with its interval by `start_keepalive`.
+    """
+
+    LOST_SESSION_ERRORS = (RetryError, IpmiTimeoutError, IpmiConnectionError,
+            TimeoutError)
+
+    # Get Message and Read Event Message Buffer are missing on purpose, the
+    # BMC removes the message they return from its queue
+    IDEMPOTENT_COMMANDS = frozenset((
+        'GetAcpiPowerState', 'GetAddressInfo', 'GetAssetTag',
+        'GetBmcGlobalEnables', 'GetChannelAuthenticationCapabilities',
+        'GetChannelInfo', 'GetChassisCapabilities', 'GetChassisStatus',
+        'GetComponentProperties', 'GetDcmiCapabilities',
+        'GetDcmiConfigurationParameters', 'GetDcmiSensorInfo',
+        'GetDeviceGuid', 'GetDeviceId', 'GetDeviceLocatorRecordId',
+        'GetDeviceSdrInfo', 'GetDeviceSdr', 'GetEventReceiver',
+        'GetFanLevel', 'GetFanSpeedProperties', 'GetFruActivationPolicy',
+        'GetFruControlCapabilities', 'GetFruInventoryAreaInfo',
+        'GetFruLedColorCapabilities', 'GetFruLedProperties',
+        'GetFruLedState', 'GetLanAttachCapabilities',
+        'GetLanConfigurationParameters', 'GetLocationInformation',
+        'GetManagementControllerIdString', 'GetMessageFlags',
+        'GetPicmgProperties', 'GetPohCounter', 'GetPortState',
+        'GetPowerChannelStatus', 'GetPowerLevel', 'GetPowerLimit',
+        'GetPowerReading', 'GetSdrRepositoryAllocationInfo',
+        'GetSdrRepositoryInfo', 'GetSdr', 'GetSelAllocationInfo',
+        'GetSelEntry', 'GetSelInfo', 'GetSelTime', 'GetSelftestResults',
+        'GetSensorEventEnable', 'GetSensorHysteresis', 'GetSensorReading',
+        'GetSensorThresholds', 'GetShelfAddressInfo', 'GetSignalingClass',
+        'GetSystemBootOptions', 'GetTargetUpgradeCapabilities',
+        'GetTelcoAlarmCapability', 'GetTemperatureReadings',
+        'GetThermalLimit', 'GetUpgradeStatus', 'GetUserAccess',
+        'GetUserName', 'GetWatchdogTimer', 'ReadFruData',
+    ))
+
+    def __init__(self, interface, session):
+        SynchronizedInterface.__init__(self, interface)
+        self._session = session
+        self.reconnects = []
+        self._last_activity = time.time()
+        self._keepalive_thread = None
+        self._keepalive_stop = None
+
+        inner = interface
+        while isinstance(inner, InterfaceWrapper):
+            inner = inner._interface
+        self.keepalive_interval = getattr(inner, 'keep_alive_interval', 0)
+        if self.keepalive_interval:
+            inner.keep_alive_interval = 0
+
+    @classmethod
+    def is_idempotent(cls, key):
+        """Returns `True` if the command `key` (netfn, cmdid, group
+        extension) can be sent again without changing its effect."""
+        msg_cls = DEFAULT_REGISTRY.registry.get(key)
+        if msg_cls is None:
+            return False
+        return msg_cls.__name__[:-len('Req')] in cls.IDEMPOTENT_COMMANDS
+
+    def _probe(self):
+        """Returns `True` if the BMC answers within the session."""
+        req = pyipmi.msgs.create_request_by_name('GetDeviceId')
+        req.target = getattr(self._interface, 'host_target',
+                pyipmi.Target(0x20))
+        try:
+            self._interface.send_and_receive(req)
+        except self.LOST_SESSION_ERRORS:
+            return False
+        return True
+
+    def _reconnect(self, reason):
+        start = time.time()
+        try:
+            self._interface.close_session()
+        except Exception:
+            pass
+        self._session.activated = False
+        reconnect = {
+            'time': start,
+            'reason': str(reason) or reason.__class__.__name__,
+            'error': None,
+        }
+        try:
+            self._interface.establish_session(self._session)
+        except Exception as e:
+            reconnect['error'] = str(e) or e.__class__.__name__
+            raise
+        finally:
+            reconnect['duration'] = time.time() - start
+            self.reconnects.append(reconnect)
+
+    def _call(self, key, func, *args):
+        with self.lock:
+            self._last_activity = time.time()
+            try:
+                return func(*args)
+            except self.LOST_SESSION_ERRORS as e:
+                if self._probe():
+                    raise
+                self._reconnect(e)
+                if not self.is_idempotent(key):
+                    raise
+            return func(*args)
+
+    def send_and_receive(self, req):
+        return self._call((req.netfn, req.cmdid, req.group_extension),
+                self._interface.send_and_receive, req)
+
+    def send_and_receive_raw(self, target, lun, netfn, raw_bytes):
+        raw_bytes = bytes(raw_bytes)
+        return self._call(_raw_command_key(netfn, raw_bytes),
+                self._interface.send_and_receive_raw, target, lun, netfn,
+                raw_bytes)
+
+    def _send_and_receive_many(self, reqs):
+        with self.lock:
+            self._last_activity = time.time()
+            rsps = self._interface.send_and_receive_many(reqs)
+            lost = [i for (i, rsp) in enumerate(rsps)
+                    if isinstance(rsp, self.LOST_SESSION_ERRORS)]
+            if not lost or self._probe():
+                return rsps
+            self._reconnect(rsps[lost[0]])
+            retry = [i for i in lost if self.is_idempotent(
+                    (reqs[i].netfn, reqs[i].cmdid, reqs[i].group_extension))]
+            if retry:
+                retried = self._interface.send_and_receive_many(
+                        [reqs[i] for i in retry])
+                for (i, rsp) in zip(retry, retried):
+                    rsps[i] = rsp
+            return rsps
+
+    def _keepalive(self, interval, stop):
+        while not stop.wait(interval / 2.0):
+            with self.lock:
+                if time.time() - self._last_activity < interval:
+                    continue
+                self._last_activity = time.time()
+                if self._probe():
+                    continue
+                try:
+                    self._reconnect(RetryError('no response to keepalive'))
+                except Exception as e:
+                    # tried again by the next keepalive or request
+                    logger.warning('Keepalive could not establish the '
+                            'session to %s again: %s',
+                            self._session.rmcp_host, e)
+
+    def start_keepalive(self, interval=None):
+        if interval is None:
+            interval = self.keepalive_interval
+        self.stop_keepalive()
+        if not interval:
+            return
+        self._keepalive_stop = threading.Event()
+        self._keepalive_thread = threading.Thread(target=self._keepalive,
+                args=(interval, self._keepalive_stop))
+        self._keepalive_thread.daemon = True
+        self._keepalive_thread.start()
+
+    def stop_keepalive(self):
+        if self._keepalive_thread is not None:
+            self._keepalive_stop.set()
+            self._keepalive_thread.join()
+            self._keepalive_thread = None
+
+
+class InstrumentedInterface(InterfaceWrapper):
+    """Measures the latency of every request sent over an interface.
+
+    The statistics are kept per command in `statistics`, which maps
+    `(netfn, cmdid, group_extension)` to a `CommandStatistics`.
+    """
+
+    TIMEOUT_ERRORS = (RetryError, IpmiTimeoutError, TimeoutError)
+
+    def __init__(self, interface):
+        InterfaceWrapper.__init__(self, interface)
+        self.statistics = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.statistics = {}
+
+    def _record(self, key, start, completion_code=None, error=None):
+        latency = time.time() - start
+        with self._lock:
+            stats = self.statistics.get(key)
+            if stats is None:
+                stats = self.statistics[key] = CommandStatistics(*key)
+            if error is None:
+                stats.latencies.record(latency)
+                stats.completion_codes[completion_code] = \
+                        stats.completion_codes.get(completion_code, 0) + 1
+            elif isinstance(error, self.TIMEOUT_ERRORS):
+                stats.timeouts += 1
+            else:
+                stats.errors += 1
+
+    def send_and_receive(self, req):
+        key = (req.netfn, req.cmdid, req.group_extension)
+        start = time.time()
+        try:
+            rsp = self._interface.send_and_receive(req)
+        except Exception as e:
+            self._record(key, start, error=e)
+            raise
+        self._record(key, start, rsp.completion_code)
+        return rsp
+
+    def _send_and_receive_many(self, reqs):
+        # the requests are in flight at the same time, the latency of each
+        # is the time until all responses are received
+        start = time.time()
+        try:
+            rsps = self._interface.send_and_receive_many(reqs)
+        except Exception as e:
+            for req in reqs:
+                self._record((req.netfn, req.cmdid, req.group_extension),
+                        start, error=e)
+            raise
+        for (req, rsp) in zip(reqs, rsps):
+            key = (req.netfn, req.cmdid, req.group_extension)
+            if isinstance(rsp, Exception):
+                self._record(key, start, error=rsp)
+            else:
+                self._record(key, start, rsp.completion_code)
+        return rsps
+
+    def send_and_receive_raw(self, target, lun, netfn, raw_bytes):
+        raw_bytes = bytes(raw_bytes)
+        key = _raw_command_key(netfn, raw_bytes)
+        start = time.time()
+        try:
+            rsp = self._interface.send_and_receive_raw(target, lun, netfn,
+                    raw_bytes)
+        except Exception as e:
+            self._record(key, start, error=e)
+            raise
+        self._record(key, start, rsp[0] if len(rsp) else None)
+        return rsp
+
+
+class RecordingInterface(InterfaceWrapper):
+    """Records every request and its response to a trace file.
+
+    The trace can be replayed with the `ReplayInterface`.
+    """
+
+    def __init__(self, interface, trace_file):
+        InterfaceWrapper.__init__(self, interface)
+        self._writer = TraceWriter(trace_file)
+        self._lock = threading.Lock()
+
+    def send_and_receive(self, req):
+        raw_bytes = bytes((req.cmdid,)) + pyipmi.msgs.encode_message(req)
+        rx_data = self.send_and_receive_raw(req.target, req.lun, req.netfn,
+                raw_bytes)
+        rsp = pyipmi.msgs.create_message(req.netfn + 1, req.cmdid,
+                req.group_extension)
+        pyipmi.msgs.decode_message(rsp, rx_data)
+        return rsp
+
+    def send_and_receive_raw(self, target, lun, netfn, raw_bytes):
+        raw_bytes = bytes(raw_bytes)
+        start = time.time()
+        try:
+            rsp = self._interface.send_and_receive_raw(target, lun, netfn,
+                    raw_bytes)
+        except Exception as e:
+            self._record_error(start, e, target, lun, netfn, raw_bytes)
+            raise
+        self._record(start, STATUS_OK, target, lun, netfn, raw_bytes,
+                bytes(rsp))
+        return rsp
+
+    def _send_and_receive_many(self, reqs):
+        # the responses are decoded by the interface, they are recorded
+        # encoded again
+        requests = [bytes((req.cmdid,)) + pyipmi.msgs.encode_message(req)
+                for req in reqs]
+        start = time.time()
+        try:
+            rsps = self._interface.send_and_receive_many(reqs)
+        except Exception as e:
+            for (req, raw_bytes) in zip(reqs, requests):
+                self._record_error(start, e, req.target, req.lun, req.netfn,
+                        raw_bytes)
+            raise
+        for (req, raw_bytes, rsp) in zip(reqs, requests, rsps):
+            if isinstance(rsp, Exception):
+                self._record_error(start, rsp, req.target, req.lun,
+                        req.netfn, raw_bytes)
+            elif rsp.completion_code != constants.CC_OK:
+                self._record(start, STATUS_OK, req.target, req.lun,
+                        req.netfn, raw_bytes, bytes((rsp.completion_code,)))
+            else:
+                self._record(start, STATUS_OK, req.target, req.lun,
+                        req.netfn, raw_bytes, pyipmi.msgs.encode_message(rsp))
+        return rsps
+
+    def _record_error(self, start, error, target, lun, netfn, request):
+        if isinstance(error, InstrumentedInterface.TIMEOUT_ERRORS):
+            status = STATUS_TIMEOUT
+        else:
+            status = STATUS_ERROR
+        self._record(start, status, target, lun, netfn, request,
+                str(error).encode('utf-8'))
+
+    def _record(self, start, status, target, lun, netfn, request, response):
+        with self._lock:
+            self._writer.write(start, time.time() - start, status, target,
+                    lun, netfn, request, response)
+
+    def close(self):
+        self._interface.close()
+        self._writer.close()
+
+
+def create_interface(interface_type, trace_file=None, replay_speed=None,
+        **kwargs):
+    """Creates an interface by its name.
+
+    Besides the interfaces of pyipmi the following are supported:
+    - `pipelinedrmcp`: RMCP with several outstanding requests, see `PipelinedRmcp`
+    - `ipmitoolshell`: a long running `ipmitool shell`, see `IpmitoolShell`
+    - `record:<type>`: an interface of the given type whose requests are
+      recorded to `trace_file`, see `RecordingInterface`
+    - `replay`: answers requests from `trace_file`, see `ReplayInterface`
+    """
+    if interface_type.startswith('record:') or interface_type == 'replay':
+        if trace_file is None:
+            raise RuntimeError('Interface type %s needs a trace file'
+                    % interface_type)
+    if interface_type.startswith('record:'):
+        interface = create_interface(interface_type[len('record:'):],
+                **kwargs)
+        return RecordingInterface(interface, trace_file)
+    if interface_type == ReplayInterface.NAME:
+        return ReplayInterface(trace_file, replay_speed, **kwargs)
+    for cls in (PipelinedRmcp, IpmitoolShell):
+        if interface_type == cls.NAME:
+            return cls(**kwargs)
+    return pyipmi.interfaces.create_interface(interface_type, **kwargs)
@@ -0,0 +1,177 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import select
+import shlex
+import time
+from array import array
+from subprocess import Popen, PIPE, STDOUT
+
+from pyipmi.errors import IpmiConnectionError, IpmiTimeoutError
+from pyipmi.interfaces.ipmitool import Ipmitool
+from pyipmi.msgs.constants import CC_OK
+from pyipmi.session import Session
+
+
+class IpmitoolShell(Ipmitool):
+    """ipmitool interface which keeps an `ipmitool shell` process running.
+
+    The `Ipmitool` interface of pyipmi starts ipmitool for every request,
+    which establishes a new session each time. This interface starts one
+    `ipmitool ... shell` process per target and LUN and writes the `raw`
+    commands to its stdin. The output of a command ends with the next
+    prompt of the shell. The command line echoed by the shell (e.g. by
+    readline) is not part of the response.
+
+    A process which exited (e.g. because the session was lost) is started
+    again with the next request.
+    """
+
+    NAME = 'ipmitoolshell'
+    PROMPT = b'ipmitool> '
+
+    def __init__(self, interface_type='lan', cipher=None, retries=None,
+            timeout=None, response_timeout=30.0, max_retries=0):
+        if retries is None and max_retries:
+            retries = max_retries
+        Ipmitool.__init__(self, interface_type, cipher, retries, timeout)
+        self.response_timeout = response_timeout
+        self._shells = {}
+
+    def _build_shell_cmd(self, target, lun):
+        session = self._get_session()
+
+        cmd = 'exec ' + self.IPMITOOL_PATH
+        cmd += ' -I %s' % self._interface_type
+        if self._interface_type in ('lan', 'lanplus'):
+            cmd += self._build_ipmitool_host(session)
+            cmd += self._build_ipmitool_priv_level(session.priv_level)
+            if self._cipher is not None:
+                cmd += ' -C %s' % self._cipher
+            cmd += self._build_ipmitool_retries()
+            if session.auth_type == Session.AUTH_TYPE_NONE:
+                cmd += ' -P ""'
+            elif session.auth_type == Session.AUTH_TYPE_PASSWORD:
+                cmd += self._build_ipmitool_credentials()
+            else:
+                raise RuntimeError('Session type %d not supported' %
+                        session.auth_type)
+        elif self._interface_type == 'serial-terminal':
+            device = '%s:%s' % (session.serial_port, session.serial_baudrate)
+            cmd += ' -D %s' % shlex.quote(device)
+
+        cmd += self._build_ipmitool_target(target)
+        cmd += ' -l %d shell' % lun
+        return cmd
+
+    def _read_until_prompt(self, child):
+        output = bytearray()
+        fd = child.stdout.fileno()
+        deadline = time.time() + self.response_timeout
+        while not output.endswith(self.PROMPT):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise IpmiTimeoutError()
+            (readable, _, _) = select.select([fd], [], [], remaining)
+            if not readable:
+                continue
+            chunk = os.read(fd, 4096)
+            if not chunk:
+                # the shell exited, the output may tell why
+                self._parse_output(bytes(output))
+                raise IpmiConnectionError('ipmitool shell exited: %s'
+                        % bytes(output).decode(errors='replace'))
+            output += chunk
+        return bytes(output[:-len(self.PROMPT)])
+
+    def _get_shell(self, target, lun):
+        key = (self._build_ipmitool_target(target), lun)
+        child = self._shells.get(key)
+        if child is not None and child.poll() is None:
+            return (key, child)
+
+        child = Popen(self._build_shell_cmd(target, lun), shell=True,
+                stdin=PIPE, stdout=PIPE, stderr=STDOUT)
+        self._shells[key] = child
+        try:
+            self._read_until_prompt(child)
+        except Exception:
+            self._stop_shell(key)
+            raise
+        return (key, child)
+
+    def _stop_shell(self, key):
+        child = self._shells.pop(key, None)
+        if child is None:
+            return
+        try:
+            if child.poll() is None:
+                child.stdin.write(b'exit\n')
+                child.stdin.flush()
+                child.wait(timeout=1)
+        except Exception:
+            child.kill()
+            child.wait()
+        child.stdin.close()
+        child.stdout.close()
+
+    @staticmethod
+    def _strip_echo(output, cmd):
+        """Removes the echo of the command line `cmd` from `output`.
+
+        Readline wraps a long command line, the echo may span several
+        lines. Its continuation lines would be parsed as response data.
+        """
+        expected = cmd.split()
+        echoed = []
+        lines = output.split(b'\n')
+        for (index, line) in enumerate(lines):
+            echoed += line.split()
+            if echoed == expected:
+                return b'\n'.join(lines[index + 1:])
+            if echoed != expected[:len(echoed)]:
+                break
+        return output
+
+    def send_and_receive_raw(self, target, lun, netfn, raw_bytes):
+        (key, child) = self._get_shell(target, lun)
+
+        cmd = ('raw ' + ' '.join('0x%02x' % d
+                for d in [netfn] + array('B', raw_bytes).tolist())).encode()
+        try:
+            child.stdin.write(cmd + b'\n')
+            child.stdin.flush()
+            output = self._read_until_prompt(child)
+        except (IOError, OSError, IpmiTimeoutError, IpmiConnectionError):
+            self._stop_shell(key)
+            raise
+
+        (cc, rsp) = self._parse_output(self._strip_echo(output, cmd))
+
+        data = array('B')
+        if cc is not None:
+            data.append(cc)
+        else:
+            data.append(CC_OK)
+            if rsp:
+                data.extend(rsp)
+        return data.tobytes()
+
+    def close_session(self):
+        for key in list(self._shells):
+            self._stop_shell(key)
+
+    def close(self):
+        self.close_session()
@@ -109,3 +109,8 @@ class TestFind(unittest.TestCase):
     def test_find_entity_type_id(self):
         val = find_entity_type_id('PICMG Front Board')
         self.assertEqual(val, 0xa0)
+
+    def test_find_sensor_type_suggestion(self):
+        with self.assertRaises(RuntimeError) as cm:
+            find_sensor_type('Temprature')
+        self.assertIn('TEMPERATURE', str(cm.exception))
@@ -309,15 +309,12 @@ class Picmg:
         entity_id = find_entity_type_id(entity_id)
         entity_instance = int_any_base(entity_instance)
 
-        for sdr in self._sdr_entries():
+        for sdr in self._sdr_list.find_by_entity(entity_id, entity_instance):
             if (sdr.type is not pyipmi.sdr.SDR_TYPE_FULL_SENSOR_RECORD and \
                     sdr.type is not pyipmi.sdr.SDR_TYPE_COMPACT_SENSOR_RECORD):
                 continue
-            if sdr.sensor_type_code != \
+            if sdr.sensor_type_code == \
                     pyipmi.sensor.SENSOR_TYPE_FRU_HOT_SWAP:
-                continue
-            if sdr.entity_id == entity_id and \
-                    sdr.entity_instance == entity_instance:
                 return sdr
 
         raise AssertionError('Hotswap Sensor for entity %s %s not found' \
@@ -336,13 +333,11 @@ class Picmg:
         if 'prefetched_hotswap_sdr' not in self._cp:
             self._cp['prefetched_hotswap_sdr'] = {}
 
-        for sdr in self._sdr_entries():
+        for sdr in self._sdr_list.find_by_sensor_type(
+                pyipmi.sensor.SENSOR_TYPE_FRU_HOT_SWAP):
             if (sdr.type is not pyipmi.sdr.SDR_TYPE_FULL_SENSOR_RECORD and \
                     sdr.type is not pyipmi.sdr.SDR_TYPE_COMPACT_SENSOR_RECORD):
                 continue
-            if sdr.sensor_type_code != \
-                    pyipmi.sensor.SENSOR_TYPE_FRU_HOT_SWAP:
-                continue
 
             self._info('HS SDR %s found' % sdr.device_id_string)
             self._cp['prefetched_hotswap_sdr'][sdr.device_id_string] = sdr
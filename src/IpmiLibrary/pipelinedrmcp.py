@@ -0,0 +1,170 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import socket
+import time
+
+from pyipmi.errors import RetryError
+from pyipmi.interfaces.ipmb import (IpmbHeaderReq, encode_ipmb_msg,
+        encode_bridged_message, decode_bridged_message, rx_filter,
+        target_ipmb_address)
+from pyipmi.interfaces.rmcp import Rmcp
+from pyipmi.msgs import (constants, create_message, encode_message,
+        decode_message)
+
+
+class PipelinedRmcp(Rmcp):
+    """RMCP interface with several requests in flight.
+
+    Single requests are sent by the `Rmcp` interface of pyipmi, so they
+    cost the same. `send_and_receive_many` sends up to `max_outstanding`
+    requests before it waits for the responses, which are matched to their
+    request by the IPMB sequence number. A request without response is
+    sent again after the timeout, at most `max_retries` times.
+    """
+
+    NAME = 'pipelinedrmcp'
+
+    def __init__(self, max_outstanding=8, **kwargs):
+        Rmcp.__init__(self, **kwargs)
+        # without a matching sequence number only one request can be
+        # outstanding
+        self.max_outstanding = 1 if self.ignore_rq_seq else max_outstanding
+
+    def _allocate_sequence_number(self, pending):
+        for _ in range(64):
+            self._inc_sequence_number()
+            if self.next_sequence_number not in pending:
+                return self.next_sequence_number
+        raise RuntimeError('no free sequence number')
+
+    def _encode_request(self, req, rq_seq):
+        header = IpmbHeaderReq()
+        header.netfn = req.netfn
+        header.rs_lun = req.lun
+        header.rs_sa = target_ipmb_address(req.target)
+        header.rq_seq = rq_seq
+        header.rq_lun = 0
+        header.rq_sa = self.slave_address
+        header.cmdid = req.cmdid
+        payload = encode_message(req)
+
+        if req.target.routing:
+            tx_data = encode_bridged_message(req.target.routing, header,
+                    payload, rq_seq)
+        else:
+            tx_data = encode_ipmb_msg(header, payload)
+        return (header, tx_data)
+
+    def _receive_any(self, timeout):
+        """Returns the next IPMI message, `None` on timeout."""
+        self._sock.settimeout(timeout)
+        try:
+            rx_data = self._receive_ipmi_msg(self.ignore_sdu_length)
+        except socket.timeout:
+            return None
+        return rx_data
+
+    def _send_pending(self, pending, rq_seq):
+        (_, _, tx_data, tries, _) = pending[rq_seq]
+        self._send_ipmi_msg(tx_data)
+        self._last_request_time = time.monotonic()
+        deadline = None
+        if self._timeout is not None:
+            deadline = self._last_request_time + self._timeout
+        pending[rq_seq][3:] = [tries + 1, deadline]
+
+    def send_and_receive_many(self, reqs):
+        """Sends all requests at once and returns their responses.
+
+        A request which failed has the exception in place of its response.
+        """
+
+        results = [None] * len(reqs)
+        queue = collections.deque(range(len(reqs)))
+        # rq_seq -> [index, header, tx_data, tries, deadline]
+        pending = {}
+
+        with self.transaction_lock:
+            try:
+                while queue or pending:
+                    while queue and len(pending) < self.max_outstanding:
+                        index = queue.popleft()
+                        rq_seq = self._allocate_sequence_number(pending)
+                        (header, tx_data) = self._encode_request(reqs[index],
+                                rq_seq)
+                        pending[rq_seq] = [index, header, tx_data, 0, None]
+                        self._send_pending(pending, rq_seq)
+
+                    now = time.monotonic()
+                    for (rq_seq, entry) in list(pending.items()):
+                        if entry[4] is None or entry[4] > now:
+                            continue
+                        if entry[3] > self.max_retries:
+                            del pending[rq_seq]
+                            results[entry[0]] = RetryError('Max retry while '
+                                    'sending and/or receiving ipmi message '
+                                    'for rmcp host %s' % self.host)
+                        else:
+                            self._send_pending(pending, rq_seq)
+                    if not pending:
+                        continue
+
+                    deadlines = [entry[4] for entry in pending.values()
+                            if entry[4] is not None]
+                    timeout = None
+                    if deadlines:
+                        timeout = max(min(deadlines) - now, 0.001)
+                    rx_data = self._receive_any(timeout)
+                    if not rx_data or len(rx_data) < 7:
+                        continue
+
+                    if self.ignore_rq_seq:
+                        rq_seq = next(iter(pending))
+                    else:
+                        rq_seq = rx_data[4] >> 2
+                    entry = pending.get(rq_seq)
+                    if entry is None:
+                        continue
+                    if rx_data[5] == constants.CMDID_SEND_MESSAGE:
+                        # all hops of a bridged request use its sequence
+                        # number, a failed hop fails the request
+                        try:
+                            rx_data = decode_bridged_message(rx_data)
+                        except Exception as e:
+                            del pending[rq_seq]
+                            results[entry[0]] = e
+                            continue
+                        if not rx_data:
+                            # the forwarded reply is expected in the next
+                            # packet
+                            continue
+                    if not rx_filter(entry[1], rx_data,
+                            rq_seq=not self.ignore_rq_seq):
+                        continue
+                    del pending[rq_seq]
+
+                    req = reqs[entry[0]]
+                    rsp = create_message(req.netfn + 1, req.cmdid,
+                            req.group_extension)
+                    try:
+                        decode_message(rsp, rx_data[6:-1])
+                        results[entry[0]] = rsp
+                    except Exception as e:
+                        results[entry[0]] = e
+            finally:
+                self._sock.settimeout(self._timeout)
+
+        return results
@@ -0,0 +1,320 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+import threading
+import time
+
+from robot import utils
+
+from .utils import int_any_base
+
+
+class SampleBuffer(object):
+    """A fixed-size ring buffer of sensor samples.
+
+    The timestamps, raw readings and states are kept in preallocated
+    arrays. A raw reading or state of -1 means the sensor did not report
+    it.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.timestamps = array.array('d', [0.0] * size)
+        self.raws = array.array('i', [-1] * size)
+        self.states = array.array('l', [-1] * size)
+        self.count = 0
+        self._next = 0
+
+    def append(self, timestamp, raw, states):
+        i = self._next
+        self.timestamps[i] = timestamp
+        self.raws[i] = -1 if raw is None else raw
+        self.states[i] = -1 if states is None else states
+        self._next = (i + 1) % self.size
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def samples(self, since=None):
+        """Returns the (timestamp, raw, states) tuples in the buffer, oldest
+        first, optionally only those taken at or after `since`.
+        """
+        n = len(self)
+        start = (self._next - n) % self.size
+        samples = []
+        for k in range(n):
+            i = (start + k) % self.size
+            if since is not None and self.timestamps[i] < since:
+                continue
+            raw = self.raws[i]
+            states = self.states[i]
+            samples.append((self.timestamps[i],
+                    None if raw == -1 else raw,
+                    None if states == -1 else states))
+        return samples
+
+    def last(self):
+        if self.count == 0:
+            return None
+        i = (self._next - 1) % self.size
+        raw = self.raws[i]
+        states = self.states[i]
+        return (self.timestamps[i], None if raw == -1 else raw,
+                None if states == -1 else states)
+
+
+class SensorSampler(threading.Thread):
+    """Polls a set of sensors in the background.
+
+    Every `interval` seconds each sensor is read and the sample is stored in
+    its `SampleBuffer`. Threads waiting on `condition` are notified after
+    each round. The raw readings are converted with the `ConversionTable`
+    of the sensor, if it has one. Failed readings are counted in `errors`,
+    `error` is the last exception.
+    """
+
+    def __init__(self, ipmi, sdrs, tables, interval, size):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self._ipmi = ipmi
+        self.sdrs = dict((sdr.device_id_string, sdr) for sdr in sdrs)
+        self.tables = dict((sdr.device_id_string, table)
+                for (sdr, table) in zip(sdrs, tables))
+        self.interval = interval
+        self.buffers = dict((name, SampleBuffer(size))
+                for name in self.sdrs)
+        self.condition = threading.Condition()
+        self.error = None
+        self.errors = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            for (name, sdr) in self.sdrs.items():
+                try:
+                    (raw, states) = self._ipmi.get_sensor_reading(sdr.number,
+                            sdr.owner_lun)
+                except Exception as e:
+                    with self.condition:
+                        self.error = e
+                        self.errors += 1
+                    continue
+                with self.condition:
+                    self.buffers[name].append(time.time(), raw, states)
+            with self.condition:
+                self.condition.notify_all()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def pop_errors(self):
+        """Returns the number of failed readings and the last exception
+        since the last call."""
+        with self.condition:
+            (errors, error) = (self.errors, self.error)
+            self.errors = 0
+            self.error = None
+        return (errors, error)
+
+    def convert(self, name, raw):
+        table = self.tables[name]
+        if table is None:
+            return raw
+        return table.to_value(raw)
+
+
+class SensorSampling:
+    @property
+    def _sensor_sampler(self):
+        try:
+            return self._cp['sensor_sampler']
+        except KeyError:
+            raise AssertionError('Sensor sampling is not started.')
+
+    def _report_sampling_errors(self, sampler):
+        (errors, error) = sampler.pop_errors()
+        if errors:
+            self._warn('%d sensor readings failed while sampling, the last '
+                    'with: %s' % (errors, error))
+
+    def _sampled_buffer(self, name):
+        sampler = self._sensor_sampler
+        try:
+            return sampler.buffers[name]
+        except KeyError:
+            raise AssertionError('Sensor "%s" is not sampled.' % name)
+
+    def start_sensor_sampling(self, *sensors, interval='1 second', size=1024):
+        """Starts reading the given sensors in the background.
+
+        `sensors` are selected like in `Get Sensor Readings`. Every
+        `interval` (given in Robot Framework's time format) each sensor is
+        read and the sample is stored in a ring buffer holding the last
+        `size` samples of the sensor.
+
+        The samples can be examined by `Get Sampled Sensor Statistics`,
+        `Wait Until Sampled Sensor Reading Satisfies` and `Wait Until Sampled
+        Sensor State Is` without further requests to the device.
+
+        Every connection has its own sampler. A running sampler is stopped
+        first.
+
+        Example:
+        | Start Sensor Sampling | Vcc +12V | sensor_type=Temperature | interval=500ms |
+        """
+
+        if len(sensors) == 1 and isinstance(sensors[0], list):
+            sensors = sensors[0]
+        interval = utils.timestr_to_secs(interval)
+        size = int_any_base(size)
+
+        sdrs = self._find_sensor_sdrs(sensors)
+        if len(sdrs) == 0:
+            raise RuntimeError('No sensors selected for sampling')
+
+        self.stop_sensor_sampling()
+        tables = [self._conversion_table(sdr) for sdr in sdrs]
+        sampler = SensorSampler(self._ipmi, sdrs, tables, interval, size)
+        self._cp['sensor_sampler'] = sampler
+        sampler.start()
+
+    def stop_sensor_sampling(self):
+        """Stops the sensor sampling of the active connection.
+
+        The samples taken so far can still be examined. Sensor readings
+        that failed while sampling are logged as a warning.
+        """
+        if 'sensor_sampler' in self._cp:
+            sampler = self._cp['sensor_sampler']
+            sampler.stop()
+            self._report_sampling_errors(sampler)
+
+    def get_sampled_sensor_statistics(self, name, period=None):
+        """Returns statistics of the samples of a sensor.
+
+        `name` is the sensor ID string. If `period` is given (in Robot
+        Framework's time format) only the samples of this period are used,
+        otherwise all samples in the buffer.
+
+        A dictionary with the following keys is returned: `count`, `min`,
+        `max`, `mean` and `slope` (change of the converted reading per
+        second, by a linear least squares fit). Samples without a reading
+        are ignored, failed readings are logged as a warning.
+
+        Example:
+        | ${stats}= | Get Sampled Sensor Statistics | Temp Inlet | 1 minute |
+        | Should Be True | ${stats['max']} < 45 |
+        """
+
+        sampler = self._sensor_sampler
+        buf = self._sampled_buffer(name)
+
+        since = None
+        if period is not None:
+            since = time.time() - utils.timestr_to_secs(period)
+
+        self._report_sampling_errors(sampler)
+        with sampler.condition:
+            samples = buf.samples(since)
+
+        points = [(t, sampler.convert(name, raw)) for (t, raw, _) in samples
+                if raw is not None]
+        stats = {'count': len(points), 'min': None, 'max': None,
+                'mean': None, 'slope': None}
+        if len(points) == 0:
+            return stats
+
+        values = [v for (_, v) in points]
+        stats['min'] = min(values)
+        stats['max'] = max(values)
+        stats['mean'] = sum(values) / len(values)
+
+        if len(points) > 1:
+            t0 = points[0][0]
+            mean_t = sum(t - t0 for (t, _) in points) / len(points)
+            sxx = sum((t - t0 - mean_t) ** 2 for (t, _) in points)
+            sxy = sum((t - t0 - mean_t) * (v - stats['mean'])
+                    for (t, v) in points)
+            if sxx > 0:
+                stats['slope'] = sxy / sxx
+        return stats
+
+    def _wait_for_sample(self, name, predicate):
+        """Waits until `predicate` is true for the last sample of the
+        sensor. Returns the time waited or `None` on timeout."""
+        sampler = self._sensor_sampler
+        buf = self._sampled_buffer(name)
+
+        start_time = time.time()
+        with sampler.condition:
+            while True:
+                last = buf.last()
+                if last is not None and predicate(last):
+                    return time.time() - start_time
+                remaining = start_time + self._timeout - time.time()
+                if remaining <= 0 or not sampler.is_alive():
+                    break
+                sampler.condition.wait(remaining)
+        self._report_sampling_errors(sampler)
+        return None
+
+    def wait_until_sampled_sensor_reading_satisfies(self, name, condition):
+        """Waits until the sampled reading of a sensor satisfies a condition.
+
+        `condition` is a Python expression in which `reading` is the
+        converted value of the last sample.
+
+        Example:
+        | Set Timeout | 2 minutes |
+        | Wait Until Sampled Sensor Reading Satisfies | Temp Inlet | reading < 40 |
+        """
+
+        sampler = self._sensor_sampler
+
+        def predicate(sample):
+            reading = sampler.convert(name, sample[1])
+            if reading is None:
+                return False
+            return eval(condition, {}, {'reading': reading})
+
+        waited = self._wait_for_sample(name, predicate)
+        if waited is None:
+            raise AssertionError('Sensor "%s" did not satisfy "%s" in %s.'
+                    % (name, condition, utils.secs_to_timestr(self._timeout)))
+        self._info('waited %s seconds until "%s" was satisfied'
+                % (waited, condition))
+
+    def wait_until_sampled_sensor_state_is(self, name, state, mask=0x7fff):
+        """Waits until the sampled state of a sensor reaches the given state.
+
+        See `Wait Until Sensor State Is`.
+        """
+
+        state = int_any_base(state)
+        mask = int_any_base(mask)
+
+        def predicate(sample):
+            return sample[2] is not None and sample[2] & mask == state & mask
+
+        waited = self._wait_for_sample(name, predicate)
+        if waited is None:
+            raise AssertionError('Sensor "%s" did not reach the state "%s" '
+                    'in %s.' % (name, state,
+                    utils.secs_to_timestr(self._timeout)))
+        self._info('waited %s seconds until state "%s" was reached'
+                % (waited, state))
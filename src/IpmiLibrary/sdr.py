@@ -20,10 +20,137 @@ from robot.utils import asserts
 from robot.utils.connectioncache import ConnectionCache
 from robot.output import LOGGER
 from robot.output.loggerhelper import Message
+import pyipmi.msgs
+from pyipmi.errors import CompletionCodeError
+from pyipmi.utils import check_rsp_completion_code
 
 from .utils import int_any_base
 from .mapping import *
 
+# time in seconds the SDR catalog is used without checking the SDR source
+SDR_CACHE_MAX_AGE = 1.0
+
+
+class ConversionTable(object):
+    """Lookup tables for the conversion of the readings of a full sensor
+    record.
+
+    The converted value of a raw reading is computed on its first lookup.
+    Only the readings a sensor actually reports are converted, some
+    linearizations (e.g. 1/x or ln) are not defined for every raw value.
+    The inverse table maps the converted values back to their raw
+    reading, other values are converted by the SDR.
+    """
+
+    _NOT_CONVERTED = object()
+
+    def __init__(self, sdr):
+        self._sdr = sdr
+        self._values = [self._NOT_CONVERTED] * 256
+        self._raws = {}
+
+    def to_value(self, raw):
+        if raw is None:
+            return None
+        value = self._values[raw]
+        if value is self._NOT_CONVERTED:
+            value = self._sdr.convert_sensor_raw_to_value(raw)
+            self._values[raw] = value
+            if raw < self._raws.get(value, 256):
+                self._raws[value] = raw
+        return value
+
+    def to_raw(self, value):
+        try:
+            return self._raws[value]
+        except KeyError:
+            return self._sdr.convert_sensor_value_to_raw(value)
+
+
+class SdrCatalog(object):
+    """An indexed list of SDRs.
+
+    The SDRs are indexed by their device ID string, record id, sensor
+    number, sensor type, record type and entity (entity id, entity
+    instance). Every index keeps the order the SDRs were read in, so the
+    first match of a lookup is the same as the first match of a linear
+    search.
+
+    `timestamps` holds the change indicators of the SDR source at the time
+    the SDRs were read, `validated_at` the time they were last checked.
+    """
+
+    def __init__(self, sdrs=(), timestamps=None):
+        self.timestamps = timestamps
+        self.validated_at = time.time()
+        self._sdrs = []
+        self._by_name = {}
+        self._by_record_id = {}
+        self._by_sensor_number = {}
+        self._by_sensor_type = {}
+        self._by_record_type = {}
+        self._by_entity = {}
+        self._conversion_tables = {}
+        self.extend(sdrs)
+
+    def __len__(self):
+        return len(self._sdrs)
+
+    def __iter__(self):
+        return iter(self._sdrs)
+
+    def append(self, sdr):
+        self._sdrs.append(sdr)
+        self._by_record_id.setdefault(sdr.id, sdr)
+        self._by_record_type.setdefault(sdr.type, []).append(sdr)
+        if hasattr(sdr, 'device_id_string'):
+            self._by_name.setdefault(sdr.device_id_string, sdr)
+        if getattr(sdr, 'number', None) is not None:
+            self._by_sensor_number.setdefault(sdr.number, []).append(sdr)
+        if hasattr(sdr, 'sensor_type_code'):
+            self._by_sensor_type.setdefault(sdr.sensor_type_code,
+                    []).append(sdr)
+        if hasattr(sdr, 'entity_id'):
+            self._by_entity.setdefault(
+                    (sdr.entity_id, getattr(sdr, 'entity_instance', None)),
+                    []).append(sdr)
+
+    def extend(self, sdrs):
+        for sdr in sdrs:
+            self.append(sdr)
+
+    def find_by_name(self, name):
+        return self._by_name.get(name)
+
+    def find_by_record_id(self, record_id):
+        return self._by_record_id.get(record_id)
+
+    def find_by_sensor_number(self, number):
+        return list(self._by_sensor_number.get(number, ()))
+
+    def find_by_sensor_type(self, sensor_type):
+        return list(self._by_sensor_type.get(sensor_type, ()))
+
+    def find_by_record_type(self, record_type):
+        return list(self._by_record_type.get(record_type, ()))
+
+    def find_by_entity(self, entity_id, entity_instance):
+        return list(self._by_entity.get((entity_id, entity_instance), ()))
+
+    def conversion_table(self, sdr):
+        """Returns the `ConversionTable` of `sdr`, which is built on first
+        use. `None` is returned for SDRs without conversion factors.
+        """
+        if not hasattr(sdr, 'convert_sensor_raw_to_value'):
+            return None
+        try:
+            return self._conversion_tables[id(sdr)][1]
+        except KeyError:
+            table = ConversionTable(sdr)
+            # keep a reference to the SDR, so its id is not reused
+            self._conversion_tables[id(sdr)] = (sdr, table)
+            return table
+
 
 class Sdr:
 
@@ -38,6 +165,7 @@ class Sdr:
         """
         if source.lower() in ('sensor device', 'sdr repository'):
             self._cp['sdr_source'] = source.lower()
+            self._invalidate_sdr_catalog()
 
     def _get_sdr_list(self):
         if self._cp['sdr_source'] == 'sensor device':
@@ -74,12 +202,14 @@ class Sdr:
     def clear_sdr_repository(self):
         """Clear the SDR repository and wait until erasure is finished.
         """
+        self._invalidate_sdr_catalog()
         return self._ipmi.clear_sdr_repository()
 
     def delete_sdr(self, record_id):
         """Delete the SDR from repository specified by 'record_id'.
         """
         record_id = int_any_base(record_id)
+        self._invalidate_sdr_catalog()
         return self._ipmi.delete_sdr(record_id)
 
     def run_initialization_agent(self):
@@ -102,15 +232,100 @@ class Sdr:
             data = [int_any_base(data)]
         data = array.array('c', [chr(c) for c in data])
 
+        self._invalidate_sdr_catalog()
         return self._ipmi.partial_add_sdr(
                 reservation_id, record_id, offset, progress, data)
 
+    def _get_sdr_source_timestamps(self):
+        """Returns the change indicators of the SDR source.
+
+        For the SDR repository these are the most recent addition and erase
+        timestamps, for the sensor device the sensor population change
+        timestamp. `None` is returned if the device does not provide them.
+        """
+        try:
+            if self._cp['sdr_source'] == 'sdr repository':
+                rsp = self._ipmi.send_message_by_name('GetSdrRepositoryInfo')
+                return (rsp.most_recent_addition, rsp.most_recent_erase)
+            else:
+                rsp = self._ipmi.send_message_by_name('GetDeviceSdrInfo')
+                if rsp.flags.dynamic_population:
+                    return (rsp.sensor_population_change,)
+                return (rsp.number_of_sensors,)
+        except CompletionCodeError:
+            return None
+
+    def _read_sdr_list(self, timestamps):
+        """Reads the SDR list, from the file cache if possible.
+
+        Without change indicators of the SDR source the file cache can't be
+        validated and is not used.
+        """
+        if self._file_cache is None or timestamps is None:
+            return self._get_sdr_list()
+
+        key = self._device_cache_key('sdr', self._cp['sdr_source'],
+                timestamps)
+        sdrs = self._file_cache.load_sdr_list(key)
+        if sdrs is None:
+            sdrs = self._get_sdr_list()
+            self._file_cache.store_sdr_list(key, sdrs)
+        else:
+            self._info('SDR list loaded from %s' % self._file_cache.directory)
+        return sdrs
+
+    def _sdr_catalog_is_valid(self, catalog):
+        if catalog.timestamps is None:
+            return True
+        max_age = self._cp.get('sdr_cache_max_age', SDR_CACHE_MAX_AGE)
+        if time.time() - catalog.validated_at < max_age:
+            return True
+        if self._get_sdr_source_timestamps() != catalog.timestamps:
+            self._info('SDR source has changed')
+            return False
+        catalog.validated_at = time.time()
+        return True
+
     @property
     def _sdr_list(self):
-        if 'prefetched_sdr_list' in self._cp:
-            return self._cp['prefetched_sdr_list']
-        else:
-            return self._get_sdr_list()
+        """The SDR catalog of the active connection.
+
+        The SDRs are read from the SDR source on first use. Later uses check
+        the change indicators of the SDR source, at most once within the SDR
+        cache max age, and read the SDRs again if they have changed.
+        """
+        catalog = self._cp.get('sdr_catalog')
+        if catalog is None or not self._sdr_catalog_is_valid(catalog):
+            timestamps = self._get_sdr_source_timestamps()
+            catalog = SdrCatalog(self._read_sdr_list(timestamps), timestamps)
+            self._cp['sdr_catalog'] = catalog
+        return catalog
+
+    def set_sdr_cache_max_age(self, max_age):
+        """Sets the time the cached SDR list is used without checking the SDR
+        source for changes.
+
+        The SDR source is checked with a single _Get SDR Repository Info_
+        (or _Get Device SDR Info_) command when the cached SDR list is used
+        after `max_age`, and the SDRs are read again only if the source has
+        changed. The default of one second checks the SDR source once per
+        keyword, a `max_age` of 0 checks it on each use of the SDR list.
+        Changes made with the keywords of this library are always seen.
+
+        `max_age` is given in Robot Framework's time format. The old value is
+        returned.
+
+        Example:
+        | ${old}= | Set SDR Cache Max Age | 10 seconds |
+        """
+
+        old = self._cp.get('sdr_cache_max_age', SDR_CACHE_MAX_AGE)
+        self._cp['sdr_cache_max_age'] = utils.timestr_to_secs(max_age)
+        return utils.secs_to_timestr(old)
+
+    def _invalidate_sdr_catalog(self):
+        if 'sdr_catalog' in self._cp:
+            del self._cp['sdr_catalog']
 
     @property
     def _selected_sdr(self):
@@ -124,10 +339,17 @@ class Sdr:
         self._cp['selected_sdr'] = value
 
     def prefetch_sdr_list(self):
-        if 'prefetched_sdr_list' in self._cp:
-            del self._cp['prefetched_sdr_list']
-        self._cp['prefetched_sdr_list'] = self._sdr_list
+        """Reads the SDR list from the SDR source.
+
+        The SDR list is read on first use and cached per connection anyway,
+        this keyword makes sure it is up to date. The SDRs are only read
+        again if the SDR source has changed.
+        """
         self._info('Prefetching SDR list')
+        catalog = self._cp.get('sdr_catalog')
+        if catalog is not None:
+            catalog.validated_at = 0
+        self._sdr_list
 
     def log_sdr_list(self):
         print('*INFO* SDR list')
@@ -135,30 +357,27 @@ class Sdr:
             print(sdr)
 
     def _find_sdr_by_name(self, name):
-        for sdr in self._sdr_list:
-            if hasattr(sdr, 'device_id_string'):
-                if sdr.device_id_string == name:
-                    return sdr
-
-        raise AssertionError('SDR with name "%s" not found in list' % (name))
+        sdr = self._sdr_list.find_by_name(name)
+        if sdr is None:
+            raise AssertionError('SDR with name "%s" not found in list'
+                    % (name))
+        return sdr
 
     def _find_sdr_by_record_id(self, sdr_id):
-        for sdr in self._sdr_list:
-            if sdr.id == sdr_id:
-                return sdr
-
-        raise AssertionError('SDR with ID "%x" not found' % sdr_id)
+        sdr = self._sdr_list.find_by_record_id(sdr_id)
+        if sdr is None:
+            raise AssertionError('SDR with ID "%x" not found' % sdr_id)
+        return sdr
 
     def _find_sdr_by_record_type(self, record_type):
-        for sdr in self._sdr_list:
-            if sdr.type == record_type:
-                return sdr
+        sdrs = self._sdr_list.find_by_record_type(record_type)
+        if sdrs:
+            return sdrs[0]
 
     def _find_sdr_by_sensor_type(self, sensor_type):
-        for sdr in self._sdr_list:
-            if hasattr(sdr, 'sensor_type_code'):
-                if sdr.sensor_type_code == sensor_type:
-                    return sdr
+        sdrs = self._sdr_list.find_by_sensor_type(sensor_type)
+        if sdrs:
+            return sdrs[0]
 
     def select_sdr_by_record_id(self, record_id):
         """Selects a SDR by its record id.
@@ -296,12 +515,9 @@ class Sdr:
         expected_reading = float(expected_reading)
 
         sdr = self._find_sdr_by_name(name)
-        (raw, _) = ac._ipmi.get_sensor_reading(sdr.number)
-        if raw is not None:
-            actual_reading = sdr.convert_sensor_reading(raw)
-        else:
-            actual_reading = None
-        asserts.assert_equal(expected_value, actual_reading, msg)
+        (raw, _) = self._ipmi.get_sensor_reading(sdr.number)
+        actual_reading = self._convert_sensor_raw_to_value(sdr, raw)
+        asserts.assert_equal(expected_reading, actual_reading, msg)
 
     def sdr_should_be_present(self, name):
         """Fails unless the SDR with the given name is present.
@@ -340,10 +556,7 @@ class Sdr:
 
         sdr = self._find_sdr_by_name(name)
         (raw, _) = self._ipmi.get_sensor_reading(sdr.number)
-        if raw is not None:
-            reading = sdr.convert_sensor_raw_to_value(raw)
-        else:
-            reading = None
+        reading = self._convert_sensor_raw_to_value(sdr, raw)
 
         return reading
 
@@ -360,6 +573,114 @@ class Sdr:
 
         return states
 
+    def _find_sensor_sdrs(self, sensors):
+        """Returns the sensor SDRs selected by `sensors`.
+
+        See `Get Sensor Readings` for the format of the selectors.
+        """
+        catalog = self._sdr_list
+        sdrs = []
+        for sensor in sensors:
+            sensor = str(sensor)
+            if sensor.startswith('sensor_type='):
+                sensor_type = find_sdr_sensor_type(sensor[12:])
+                found = catalog.find_by_sensor_type(sensor_type)
+            elif sensor.startswith('entity='):
+                (entity_id, entity_instance) = sensor[7:].split(':')
+                found = catalog.find_by_entity(
+                        find_entity_type_id(entity_id),
+                        int_any_base(entity_instance))
+            else:
+                found = [catalog.find_by_name(sensor)]
+                if found[0] is None:
+                    raise AssertionError('SDR with name "%s" not found in '
+                            'list' % (sensor))
+
+            for sdr in found:
+                if sdr.type not in (pyipmi.sdr.SDR_TYPE_FULL_SENSOR_RECORD,
+                        pyipmi.sdr.SDR_TYPE_COMPACT_SENSOR_RECORD):
+                    continue
+                if sdr not in sdrs:
+                    sdrs.append(sdr)
+        return sdrs
+
+    def get_sensor_readings(self, *sensors):
+        """Returns the readings and states of several sensors at once.
+
+        `sensors` can either be a list or several scalar values. Each value
+        is either a sensor ID string, `sensor_type=<type>` to select all
+        sensors of a sensor type or `entity=<entity_id>:<entity_instance>`
+        to select all sensors of an entity.
+
+        The SDRs of all sensors are looked up first, then the sensors are
+        read back to back. With the `pipelinedrmcp` interface all requests are
+        sent at once. A dictionary is returned which maps each sensor
+        ID string to a dictionary with the converted `reading` and the
+        `states`. The reading of sensors without conversion factors is the
+        raw value.
+
+        Example:
+        | ${snapshot}= | Get Sensor Readings | Vcc +12V | sensor_type=Temperature | entity=PICMG Front Board:0x60 |
+        | Should Be True | ${snapshot['Vcc +12V']['reading']} > 11.4 |
+        """
+
+        if len(sensors) == 1 and isinstance(sensors[0], list):
+            sensors = sensors[0]
+
+        sdrs = self._find_sensor_sdrs(sensors)
+        snapshot = {}
+        for (sdr, (raw, states)) in zip(sdrs, self._read_sensors(sdrs)):
+            reading = self._convert_sensor_raw_to_value(sdr, raw)
+            snapshot[sdr.device_id_string] = {
+                'reading': reading,
+                'states': states,
+            }
+        return snapshot
+
+    def _read_sensors(self, sdrs):
+        """Returns the (raw reading, states) tuples of the given sensors."""
+        if not hasattr(self._ipmi.interface, 'send_and_receive_many'):
+            return [self._ipmi.get_sensor_reading(sdr.number, sdr.owner_lun)
+                    for sdr in sdrs]
+
+        reqs = []
+        for sdr in sdrs:
+            req = pyipmi.msgs.create_request_by_name('GetSensorReading')
+            req.sensor_number = sdr.number
+            req.lun = sdr.owner_lun
+            reqs.append(req)
+
+        # the responses are evaluated like by get_sensor_reading of pyipmi
+        readings = []
+        for rsp in self._send_messages(reqs):
+            check_rsp_completion_code(rsp)
+            raw = rsp.sensor_reading
+            if rsp.config.initial_update_in_progress:
+                raw = None
+            states = None
+            if rsp.states1 is not None:
+                states = rsp.states1
+                if rsp.states2 is not None:
+                    states |= (rsp.states2 << 8)
+            readings.append((raw, states))
+        return readings
+
+    def _conversion_table(self, sdr):
+        catalog = self._cp.get('sdr_catalog')
+        if catalog is not None:
+            return catalog.conversion_table(sdr)
+        # without a catalog the table is not kept, creating it is cheap as
+        # it only converts the readings that are looked up
+        if not hasattr(sdr, 'convert_sensor_raw_to_value'):
+            return None
+        return ConversionTable(sdr)
+
+    def _convert_sensor_raw_to_value(self, sdr, raw):
+        table = self._conversion_table(sdr)
+        if table is None:
+            return raw
+        return table.to_value(raw)
+
     def _check_valid_threshold_name(self, threshold):
         if threshold not in ('lnr', 'lcr', 'lnc', 'unc', 'ucr', 'unr'):
             raise RuntimeError('Invalid threshold "%s"' % threshold)
@@ -383,11 +704,11 @@ class Sdr:
 
         thresholds = self._ipmi.get_sensor_thresholds(sdr.number, sdr.owner_lun)
 
+        table = self._conversion_table(sdr)
         converted_thresholds = {}
         for t in ('lnr', 'lcr', 'lnc', 'unc', 'ucr', 'unr'):
             if t in thresholds:
-                converted_thresholds[t] \
-                    = sdr.convert_sensor_raw_to_value(thresholds[t])
+                converted_thresholds[t] = table.to_value(thresholds[t])
         return converted_thresholds[threshold]
 
     def set_sensor_threshold(self, name, threshold, value):
@@ -402,7 +723,7 @@ class Sdr:
 
         sdr = self._find_sdr_by_name(name)
         thresholds = {}
-        thresholds[threshold] = sdr.convert_sensor_value_to_raw(value)
+        thresholds[threshold] = self._conversion_table(sdr).to_raw(value)
         self._ipmi.set_sensor_thresholds(sdr.number, sdr.owner_lun,
                 **thresholds)
 
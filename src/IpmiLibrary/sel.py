@@ -12,11 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import binascii
+import itertools
+import json
+import os
 import struct
 import time
+from array import array
 
 from robot import utils
+from robot.libraries.BuiltIn import BuiltIn, RobotNotRunningError
 from robot.utils import asserts
+import pyipmi.sel
+from pyipmi.errors import CompletionCodeError
 
 from .utils import int_any_base
 from .mapping import *
@@ -25,13 +33,362 @@ from .mapping import *
 class NotSupportedError(Exception):
     pass
 
+
+class SelRecordStore(object):
+    """An indexed list of SEL records.
+
+    Besides keeping the records in the order they were read, the store
+    maintains hash indexes on the record id, the sensor type, the sensor
+    number and the (sensor type, event type) tuple. The indexes are built
+    when the records are added, so a lookup only costs the number of
+    matches.
+
+    The store also remembers the SEL state (most recent addition and erase
+    timestamps, overflow flag) at the time it was last synchronized, which
+    is used to update it incrementally.
+    """
+
+    def __init__(self, records=()):
+        self.most_recent_addition = None
+        self.most_recent_erase = None
+        self.overflow = False
+        self._records = []
+        self._by_record_id = {}
+        self._by_sensor_type = {}
+        self._by_sensor_number = {}
+        self._by_sensor_type_event_type = {}
+        self.extend(records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def append(self, record):
+        self._records.append(record)
+        self._by_record_id[record.record_id] = record
+        self._by_sensor_type.setdefault(record.sensor_type,
+                []).append(record)
+        self._by_sensor_number.setdefault(record.sensor_number,
+                []).append(record)
+        self._by_sensor_type_event_type.setdefault(
+                (record.sensor_type, record.event_type), []).append(record)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def clear(self):
+        del self._records[:]
+        self._by_record_id.clear()
+        self._by_sensor_type.clear()
+        self._by_sensor_number.clear()
+        self._by_sensor_type_event_type.clear()
+
+    def set_sel_info(self, sel_info):
+        self.most_recent_addition = sel_info.most_recent_addition
+        self.most_recent_erase = sel_info.most_recent_erase
+        self.overflow = 'overflow_flag' in sel_info.operation_support
+
+    def copy(self):
+        """Returns a copy of the store, later updates of the store do not
+        change the copy."""
+        store = SelRecordStore(self._records)
+        store.most_recent_addition = self.most_recent_addition
+        store.most_recent_erase = self.most_recent_erase
+        store.overflow = self.overflow
+        return store
+
+    def find_by_record_id(self, record_id):
+        return self._by_record_id.get(record_id)
+
+    def count_by_sensor_type(self, sensor_type):
+        return len(self._by_sensor_type.get(sensor_type, ()))
+
+    def find_by_sensor_type(self, sensor_type):
+        return list(self._by_sensor_type.get(sensor_type, ()))
+
+    def find_by_sensor_number(self, number):
+        return list(self._by_sensor_number.get(number, ()))
+
+    def find_by_sensor_type_event_type(self, sensor_type, event_type):
+        return list(self._by_sensor_type_event_type.get(
+                (sensor_type, event_type), ()))
+
+
+def _positions(column, value):
+    """Returns the indexes of `value` in the bytes `column`."""
+    positions = []
+    index = column.find(value)
+    while index != -1:
+        positions.append(index)
+        index = column.find(value, index + 1)
+    return positions
+
+
+class SelTable(object):
+    """A compact table of SEL records.
+
+    The table has the same interface as `SelRecordStore`, but keeps the
+    raw 16 byte records in one `bytearray` instead of one object per
+    record. The record ids, timestamps and generator ids are decoded into
+    parallel arrays. The one byte fields (sensor type, sensor number, event
+    type and direction, event data) are read as strided slices of the raw
+    records, so a query scans a column in C instead of looping over the
+    records in Python.
+
+    `SelEntry` objects are only created for the records returned by a
+    query.
+    """
+
+    RECORD_LENGTH = 16
+
+    # offsets of the one byte fields within a record
+    SENSOR_TYPE = 10
+    SENSOR_NUMBER = 11
+    EVENT_DIR_TYPE = 12
+    EVENT_DATA = 13
+
+    _EVENT_TYPE_TABLE = bytes(b & 0x7f for b in range(256))
+    _EVENT_DIRECTION_TABLE = bytes(b >> 7 for b in range(256))
+
+    def __init__(self, records=()):
+        self.most_recent_addition = None
+        self.most_recent_erase = None
+        self.overflow = False
+        self._data = bytearray()
+        self._record_ids = array('H')
+        self._timestamps = array('I')
+        self._generator_ids = array('H')
+        self.extend(records)
+
+    def __len__(self):
+        return len(self._record_ids)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._record(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('SEL table index out of range')
+        return self._record(index)
+
+    def _record(self, index):
+        offset = index * self.RECORD_LENGTH
+        return pyipmi.sel.SelEntry(
+                self._data[offset:offset + self.RECORD_LENGTH])
+
+    def append_raw(self, data):
+        if len(data) != self.RECORD_LENGTH:
+            raise ValueError('Invalid SEL record length (%d)' % len(data))
+        (record_id, _, timestamp, generator_id) = struct.unpack_from(
+                '<HBIH', data)
+        self._data += data
+        self._record_ids.append(record_id)
+        self._timestamps.append(timestamp)
+        self._generator_ids.append(generator_id)
+
+    def append(self, record):
+        self.append_raw(bytes(record.data))
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def clear(self):
+        del self._data[:]
+        del self._record_ids[:]
+        del self._timestamps[:]
+        del self._generator_ids[:]
+
+    def set_sel_info(self, sel_info):
+        self.most_recent_addition = sel_info.most_recent_addition
+        self.most_recent_erase = sel_info.most_recent_erase
+        self.overflow = 'overflow_flag' in sel_info.operation_support
+
+    def copy(self):
+        """Returns a copy of the table, later updates of the table do not
+        change the copy."""
+        table = SelTable()
+        table._data = bytearray(self._data)
+        table._record_ids = array('H', self._record_ids)
+        table._timestamps = array('I', self._timestamps)
+        table._generator_ids = array('H', self._generator_ids)
+        table.most_recent_addition = self.most_recent_addition
+        table.most_recent_erase = self.most_recent_erase
+        table.overflow = self.overflow
+        return table
+
+    @property
+    def raw_data(self):
+        return bytes(self._data)
+
+    @property
+    def record_ids(self):
+        return self._record_ids
+
+    @property
+    def timestamps(self):
+        return self._timestamps
+
+    @property
+    def generator_ids(self):
+        return self._generator_ids
+
+    def _column(self, offset):
+        return bytes(self._data[offset::self.RECORD_LENGTH])
+
+    @property
+    def sensor_types(self):
+        return self._column(self.SENSOR_TYPE)
+
+    @property
+    def sensor_numbers(self):
+        return self._column(self.SENSOR_NUMBER)
+
+    @property
+    def event_types(self):
+        return self._column(self.EVENT_DIR_TYPE).translate(
+                self._EVENT_TYPE_TABLE)
+
+    @property
+    def event_directions(self):
+        return self._column(self.EVENT_DIR_TYPE).translate(
+                self._EVENT_DIRECTION_TABLE)
+
+    def event_data(self, index):
+        """Returns the column of event data byte `index` (1 - 3)."""
+        return self._column(self.EVENT_DATA + index - 1)
+
+    def find_by_record_id(self, record_id):
+        try:
+            return self._record(self._record_ids.index(record_id))
+        except ValueError:
+            return None
+
+    def count_by_sensor_type(self, sensor_type):
+        return self.sensor_types.count(sensor_type)
+
+    def find_by_sensor_type(self, sensor_type):
+        return [self._record(i)
+                for i in _positions(self.sensor_types, sensor_type)]
+
+    def find_by_sensor_number(self, number):
+        return [self._record(i)
+                for i in _positions(self.sensor_numbers, number)]
+
+    def find_by_sensor_type_event_type(self, sensor_type, event_type):
+        event_types = self.event_types
+        return [self._record(i)
+                for i in _positions(self.sensor_types, sensor_type)
+                if event_types[i] == event_type]
+
+
+SEL_FILE_MAGIC = b'IPMISEL1'
+
+SEL_FILE_FORMATS = ('binary', 'jsonl')
+
+
+def _sel_record_to_json(data):
+    record = pyipmi.sel.SelEntry(data)
+    return json.dumps({
+        'record_id': record.record_id,
+        'type': record.type,
+        'timestamp': record.timestamp,
+        'generator_id': record.generator_id,
+        'sensor_type': record.sensor_type,
+        'sensor_number': record.sensor_number,
+        'event_direction': record.event_direction,
+        'event_type': record.event_type,
+        'event_data': list(record.event_data),
+        'raw': binascii.hexlify(data).decode('ascii'),
+    }, sort_keys=True)
+
+
+def write_sel_file(path, records, format='binary'):
+    """Writes the raw SEL records `records` to a file.
+
+    The binary format is `SEL_FILE_MAGIC` followed by the 16 byte records.
+    The `jsonl` format has one JSON object per line with the decoded fields
+    and the raw record. The records are written as they are iterated.
+    Returns the number of records written.
+    """
+    if format not in SEL_FILE_FORMATS:
+        raise RuntimeError('Unknown SEL file format "%s"' % format)
+
+    count = 0
+    if format == 'binary':
+        with open(path, 'wb') as f:
+            f.write(SEL_FILE_MAGIC)
+            for data in records:
+                f.write(data)
+                count += 1
+    else:
+        with open(path, 'w') as f:
+            for data in records:
+                f.write(_sel_record_to_json(data) + '\n')
+                count += 1
+    return count
+
+
+def read_sel_file(path, chunk_size=4096):
+    """Yields the raw SEL records of a file written by `write_sel_file`.
+
+    The format is detected by the magic of the binary format.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(SEL_FILE_MAGIC)) == SEL_FILE_MAGIC:
+            while True:
+                chunk = f.read(SelTable.RECORD_LENGTH * chunk_size)
+                if len(chunk) % SelTable.RECORD_LENGTH:
+                    raise RuntimeError('%s is truncated' % path)
+                if not chunk:
+                    break
+                for offset in range(0, len(chunk), SelTable.RECORD_LENGTH):
+                    yield chunk[offset:offset + SelTable.RECORD_LENGTH]
+        else:
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield binascii.unhexlify(json.loads(line)['raw'])
+
+
+def load_sel_table(path):
+    """Returns a `SelTable` with the records of a SEL file."""
+    table = SelTable()
+    for data in read_sel_file(path):
+        table.append_raw(data)
+    return table
+
+
+def diff_sel_tables(old, new):
+    """Returns the indexes of the records of `new` which are not in `old`.
+
+    Records are matched by their record id and timestamp, so a record id
+    reused after the SEL was cleared counts as a new record.
+    """
+    known = set(zip(old.record_ids, old.timestamps))
+    return [index for (index, key) in
+            enumerate(zip(new.record_ids, new.timestamps))
+            if key not in known]
+
+
 class Sel:
     @property
     def _sel_records(self):
         if 'prefetched_sel_records' in self._cp:
             return self._cp['prefetched_sel_records']
         else:
-            return self._ipmi.get_sel_entries()
+            return SelRecordStore(self._ipmi.get_sel_entries())
 
     @property
     def _selected_sel_record(self):
@@ -44,67 +401,301 @@ class Sel:
     def _selected_sel_record(self, value):
         self._cp['selected_sel_record'] = value
 
+    def _iter_sel_records(self):
+        """Returns an iterator over the SEL records.
+
+        The prefetched records are used if there are any. Otherwise the
+        records are read from the SEL one by one while iterating, so
+        stopping the iteration early also stops reading the SEL.
+        """
+        if 'prefetched_sel_records' in self._cp:
+            return iter(self._cp['prefetched_sel_records'])
+        else:
+            return self._ipmi.sel_entries()
+
+    def _find_sel_records(self, predicate, limit=None):
+        """Returns the SEL records for which `predicate` is true.
+
+        Reading the SEL stops after `limit` matching records.
+        """
+        records = []
+        for record in self._iter_sel_records():
+            if predicate(record):
+                records.append(record)
+                if limit is not None and len(records) >= limit:
+                    break
+        return records
+
     def _invalidate_prefetched_sel_records(self):
         if 'prefetched_sel_records' in self._cp:
             del self._cp['prefetched_sel_records']
 
-    def prefetch_sel(self):
+    def _get_sel_info(self):
+        return pyipmi.sel.SelInfo(self._ipmi.send_message_by_name('GetSelInfo'))
+
+    def _reload_sel_records(self, store, sel_info):
+        store.clear()
+        store.extend(self._ipmi.sel_entries())
+        store.set_sel_info(sel_info)
+
+    def _update_sel_records(self, store):
+        """Updates `store` with the records added since its last update.
+
+        Only the new records are read. The whole SEL is read again if it was
+        cleared or has overflowed in the meantime.
+        """
+
+        sel_info = self._get_sel_info()
+
+        if (len(store) == 0
+                or sel_info.most_recent_erase != store.most_recent_erase
+                or sel_info.entries < len(store)
+                or ('overflow_flag' in sel_info.operation_support
+                    and not store.overflow)):
+            self._reload_sel_records(store, sel_info)
+            return
+
+        if (sel_info.most_recent_addition == store.most_recent_addition
+                and sel_info.entries == len(store)):
+            return
+
+        last_record = store[-1]
+        new_records = []
+        try:
+            reservation_id = self._ipmi.get_sel_reservation_id()
+            (record, next_record_id) = self._ipmi.get_sel_entry(
+                    last_record.record_id, reservation_id)
+            if bytes(record.data) != bytes(last_record.data):
+                # the SEL was cleared and refilled in the meantime
+                self._reload_sel_records(store, sel_info)
+                return
+            while next_record_id != 0xffff:
+                (record, next_record_id) = self._ipmi.get_sel_entry(
+                        next_record_id, reservation_id)
+                new_records.append(record)
+        except CompletionCodeError:
+            # the last known record is gone or the reservation was canceled
+            self._reload_sel_records(store, sel_info)
+            return
+
+        store.extend(new_records)
+        store.set_sel_info(sel_info)
+
+    def _poll_sel_records(self):
+        """Returns the SEL records of the connection, updated incrementally.
+        """
+
+        if 'polled_sel_records' in self._cp:
+            self._update_sel_records(self._cp['polled_sel_records'])
+        else:
+            store = self._cp.get('sel_store_class', SelRecordStore)()
+            self._reload_sel_records(store, self._get_sel_info())
+            self._cp['polled_sel_records'] = store
+        return self._cp['polled_sel_records']
+
+    def prefetch_sel(self, compact=False):
         """Prefetches the sensor event log.
 
         Fetching the SEL is required for all further operation on the SEL.
 
+        If `compact` is true, the records are kept in a compact table of
+        the raw records instead of one object per record, which needs much
+        less memory for large SELs. The setting is kept for the following
+        polls of the SEL.
+
         See `Sel Should Contain X Times Sensor Type`, `Select Sel Record By
         Sensor Type` and `Wait Until Sel Contains Sensor Type`.
+
+        Example:
+        | Prefetch SEL | compact=${True} |
         """
 
         self._info('Prefetching SEL')
         self._invalidate_prefetched_sel_records()
-        self._cp['prefetched_sel_records'] = self._ipmi.get_sel_entries()
+        store_class = SelTable if utils.is_truthy(compact) else SelRecordStore
+        if self._cp.get('sel_store_class', SelRecordStore) is not store_class:
+            self._cp['sel_store_class'] = store_class
+            self._cp.pop('polled_sel_records', None)
+        # a copy, so the following polls do not change the prefetched records
+        self._cp['prefetched_sel_records'] = self._poll_sel_records().copy()
 
     def clear_sel(self):
         """Clears the sensor event log."""
         self._invalidate_prefetched_sel_records()
+        if 'polled_sel_records' in self._cp:
+            del self._cp['polled_sel_records']
         self._ipmi.clear_sel()
 
     def get_sel_entries_count(self):
         """Returns the number of entries in SEL."""
         return self._ipmi.get_sel_entries_count()
 
-    def log_sel(self):
-        """Dumps the sensor event log and logs it."""
+    def _output_dir(self):
+        try:
+            output_dir = BuiltIn().get_variable_value('${OUTPUT DIR}')
+        except RobotNotRunningError:
+            output_dir = None
+        return output_dir or os.getcwd()
+
+    def _sel_file_path(self, filename):
+        if os.path.isabs(filename):
+            return filename
+        return os.path.join(self._output_dir(), filename)
+
+    def _sel_file_link(self, path):
+        """Returns the link to `path` in the log, relative to the output
+        directory, so it still works when the output directory is moved."""
+        try:
+            link = os.path.relpath(path, self._output_dir())
+        except ValueError:
+            # on another drive
+            return 'file:///' + os.path.abspath(path).replace(os.sep, '/')
+        return link.replace(os.sep, '/')
+
+    def log_sel(self, filename=None, chunk_size=256):
+        """Dumps the sensor event log to a file.
+
+        The records are written to the file while they are read from the
+        SEL, `chunk_size` records at a time, instead of logging them as one
+        message. Only a link to the file is logged.
+
+        A relative `filename` is relative to the output directory, the
+        default is `sel-<date>-<time>.log`. The path of the file is
+        returned.
+
+        Example:
+        | ${path}= | Log SEL |
+        | Log SEL | sel-after-reset.log |
+        """
+
+        if filename is None:
+            filename = 'sel-%s.log' % time.strftime('%Y%m%d-%H%M%S')
+        path = self._sel_file_path(filename)
+        chunk_size = int_any_base(chunk_size)
+
+        count = 0
+        records = self._iter_sel_records()
+        with open(path, 'w') as f:
+            while True:
+                chunk = [str(record) for record in
+                        itertools.islice(records, chunk_size)]
+                if not chunk:
+                    break
+                f.write('\n'.join(chunk) + '\n')
+                count += len(chunk)
+
+        print('*HTML* SEL with %d records written to <a href="%s">%s</a>'
+                % (count, utils.html_escape(self._sel_file_link(path)),
+                   utils.html_escape(os.path.basename(path))))
+        return path
+
+    def export_sel(self, filename, format='binary'):
+        """Exports the sensor event log to a file.
+
+        `format` is either `binary` for the raw 16 byte records or `jsonl`
+        for one JSON object per line with the decoded fields and the raw
+        record. The records are written while they are read from the SEL,
+        prefetched records are not used. A relative `filename` is relative
+        to the output directory. The path of the file is returned.
+
+        See `Load SEL` and `SEL Snapshot Should Not Have New Events`.
+
+        Example:
+        | Export SEL | sel-before.bin |
+        | Export SEL | sel-before.jsonl | jsonl |
+        """
+
+        path = self._sel_file_path(filename)
+        records = (bytes(record.data) for record in self._ipmi.sel_entries())
+        count = write_sel_file(path, records, format.lower())
+        self._info('Exported %d SEL records to %s' % (count, path))
+        return path
 
-        print('*INFO* SEL')
-        for record in self._sel_records:
-            print(record)
+    def load_sel(self, filename):
+        """Loads a sensor event log exported by `Export SEL`.
 
-    def _find_sel_records_by_sensor_type(self, type):
-        matches = []
-        for record in self._sel_records:
-            if record.sensor_type == type:
-                matches.append(record)
-        return matches
+        The format of the file is detected automatically. The records are
+        returned as a compact SEL table.
+        """
+        return load_sel_table(self._sel_file_path(filename))
+
+    def _sel_snapshot(self, snapshot):
+        if snapshot is None:
+            # the current SEL, not the prefetched records
+            table = SelTable()
+            for record in self._ipmi.sel_entries():
+                table.append(record)
+            return table
+        elif isinstance(snapshot, SelTable):
+            return snapshot
+        elif isinstance(snapshot, SelRecordStore):
+            return SelTable(snapshot)
+        return self.load_sel(snapshot)
+
+    def get_new_sel_records(self, old, new=None):
+        """Returns the SEL records added between two snapshots.
+
+        `old` and `new` are either file names of SELs exported by `Export
+        SEL` or SELs loaded by `Load SEL`. If `new` is not given, the
+        current SEL is used. Records are matched by their record id and
+        timestamp, the records of `new` not found in `old` are returned.
+
+        Example:
+        | Export SEL | sel-before.bin |
+        | Run Test |
+        | ${records}= | Get New SEL Records | sel-before.bin |
+        """
+
+        old = self._sel_snapshot(old)
+        new = self._sel_snapshot(new)
+        return [new[index] for index in diff_sel_tables(old, new)]
+
+    def sel_snapshot_should_not_have_new_events(self, old, new=None,
+            msg=None):
+        """Fails if SEL records were added between two snapshots.
+
+        See `Get New SEL Records` for the arguments.
+        """
+
+        records = self.get_new_sel_records(old, new)
+        if records:
+            for record in records:
+                self._info(str(record))
+            raise AssertionError(msg or '%d new SEL records found'
+                    % len(records))
+
+    def _find_sel_records_by_sensor_type(self, type, limit=None):
+        if 'prefetched_sel_records' in self._cp:
+            records = self._cp['prefetched_sel_records'] \
+                    .find_by_sensor_type(type)
+            return records[:limit]
+        return self._find_sel_records(
+                lambda record: record.sensor_type == type, limit)
 
     def _find_sel_records_by_sensor_type_event_type(self, sensor_type,
-                                                    event_type):
-        matches = []
-        for record in self._sel_records:
-            if (record.sensor_type == sensor_type and
-                record.event_type == event_type):
-                matches.append(record)
-        return matches;
-
-    def _find_sel_records_by_sensor_number(self, number):
-        matches = []
-        for record in self._sel_records:
-            if record.sensor_number == number:
-                matches.append(record)
-        return matches
+                                                    event_type, limit=None):
+        if 'prefetched_sel_records' in self._cp:
+            records = self._cp['prefetched_sel_records'] \
+                    .find_by_sensor_type_event_type(sensor_type, event_type)
+            return records[:limit]
+        return self._find_sel_records(
+                lambda record: (record.sensor_type == sensor_type
+                                and record.event_type == event_type), limit)
+
+    def _find_sel_records_by_sensor_number(self, number, limit=None):
+        if 'prefetched_sel_records' in self._cp:
+            records = self._cp['prefetched_sel_records'] \
+                    .find_by_sensor_number(number)
+            return records[:limit]
+        return self._find_sel_records(
+                lambda record: record.sensor_number == number, limit)
 
     def sel_should_contain_x_entries(self, count, msg=None):
         """Fails if the SEL does not contain `count` entries.
         """
         count = int(count)
-        asserts.assert_equal(count, len(self._sel_records), msg)
+        actual_count = sum(1 for _ in self._iter_sel_records())
+        asserts.assert_equal(count, actual_count, msg)
 
     def sel_should_contain_x_times_sensor_type(self, type, count, msg=None):
         """Fails if the SEL does not contain `count` times an event with the
@@ -114,15 +705,19 @@ class Sel:
         type = find_sensor_type(type)
         count = int(count)
 
-        records = self._find_sel_records_by_sensor_type(type)
-        asserts.assert_equal(count, len(records), msg)
+        if 'prefetched_sel_records' in self._cp:
+            actual_count = self._cp['prefetched_sel_records'] \
+                    .count_by_sensor_type(type)
+        else:
+            actual_count = len(self._find_sel_records_by_sensor_type(type))
+        asserts.assert_equal(count, actual_count, msg)
 
     def sel_should_contain_sensor_type(self, type, msg=None):
         """Fails if SEL contains the given sensor type.
         """
 
         type = find_sensor_type(type)
-        records = self._find_sel_records_by_sensor_type(type)
+        records = self._find_sel_records_by_sensor_type(type, limit=1)
         if len(records) == 0:
             raise AssertionError('SEL doesn`t contain sensor type %s' % type)
 
@@ -131,7 +726,7 @@ class Sel:
         """
 
         type = find_sensor_type(type)
-        records = self._find_sel_records_by_sensor_type(type)
+        records = self._find_sel_records_by_sensor_type(type, limit=1)
         if len(records) != 0:
             raise AssertionError('SEL contains sensor type %s' % type)
 
@@ -139,6 +734,8 @@ class Sel:
         """Waits until the specified sensor type appears at least `count`
         times within the SEL.
 
+        Only the records added since the last poll are read from the SEL.
+
         Note: this keyword invalidates the prefetched SEL records. You have to
         rerun the `Prefetch SEL` keyword.
         """
@@ -149,7 +746,7 @@ class Sel:
         self._invalidate_prefetched_sel_records()
         start_time = time.time()
         while time.time() < start_time + self._timeout:
-            records = self._find_sel_records_by_sensor_type(type)
+            records = self._poll_sel_records().find_by_sensor_type(type)
             if len(records) >= count:
                 self._selected_sel_record = records[0]
                 return
@@ -165,6 +762,8 @@ class Sel:
         """Waits until the specified sensor type / event type combination
         appears at least `count` times within the SEL.
 
+        Only the records added since the last poll are read from the SEL.
+
         Note: this keyword invalidates the prefetched SEL records. You have to
         rerun the `Prefetch SEL` keyword.
         """
@@ -177,8 +776,8 @@ class Sel:
         self._invalidate_prefetched_sel_records()
         start_time = time.time()
         while time.time() < start_time + self._timeout:
-            records = self._find_sel_records_by_sensor_type_event_type(sensor_type,
-                                                                       event_type)
+            records = self._poll_sel_records().find_by_sensor_type_event_type(
+                    sensor_type, event_type)
             if len(records) >= count:
                 self._selected_sel_record = records[0]
                 return
@@ -194,6 +793,8 @@ class Sel:
         """Waits until the specified sensor number appears at least `count`
         times within the SEL.
 
+        Only the records added since the last poll are read from the SEL.
+
         Note: this keyword invalidates the prefetched SEL records. You have to
         rerun the `Prefetch SEL` keyword.
         """
@@ -203,7 +804,7 @@ class Sel:
         self._invalidate_prefetched_sel_records()
         start_time = time.time()
         while time.time() < start_time + self._timeout:
-            records = self._find_sel_records_by_sensor_number(number)
+            records = self._poll_sel_records().find_by_sensor_number(number)
             if len(records) >= count:
                 self._selected_sel_record = records[0]
                 return
@@ -263,7 +864,14 @@ class Sel:
         """Selects a SEL record at offset.
         """
         offset = int_any_base(offset)
-        self._selected_sel_record = self._sel_records[offset]
+        if offset < 0 or 'prefetched_sel_records' in self._cp:
+            self._selected_sel_record = self._sel_records[offset]
+            return
+        try:
+            self._selected_sel_record = next(itertools.islice(
+                    self._iter_sel_records(), offset, None))
+        except StopIteration:
+            raise IndexError('SEL record offset %d out of range' % offset)
 
     def select_sel_record_by_sensor_type(self, type, index=1):
         """Selects a SEL record.
@@ -343,7 +951,8 @@ class Sel:
         if index == 0:
             raise RuntimeError('index must not be zero')
 
-        records = self._find_sel_records_by_sensor_type(type)
+        records = self._find_sel_records_by_sensor_type(type,
+                limit=index if index > 0 else None)
         if len(records) == 0:
             raise AssertionError(
                     'No SEL record found with sensor type "%s"' % type)
@@ -363,7 +972,8 @@ class Sel:
         if index == 0:
             raise RuntimeError('index must not be zero')
 
-        records = self._find_sel_records_by_sensor_number(number)
+        records = self._find_sel_records_by_sensor_number(number,
+                limit=index if index > 0 else None)
         if len(records) == 0:
             raise AssertionError(
                     'No SEL record found from sensor number "%d"' % number)
@@ -379,10 +989,15 @@ class Sel:
     def select_sel_record_by_record_id(self, record_id):
         record_id = int_any_base(record_id)
 
-        for record in self._sel_records:
-            if record.record_id == record_id:
-                self._selected_sel_record = record
-                return
+        if 'prefetched_sel_records' in self._cp:
+            record = self._cp['prefetched_sel_records'] \
+                    .find_by_record_id(record_id)
+        else:
+            records = self._find_sel_records(
+                    lambda record: record.record_id == record_id, limit=1)
+            record = records[0] if records else None
+        if record is not None:
+            self._selected_sel_record = record
 
     def selected_sel_records_event_data_should_be_equal(self, expected_value,
             mask=0xffffff, msg=None):
@@ -0,0 +1,609 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A simulated BMC answering IPMI v1.5 requests over RMCP on a local port.
+
+The simulator models an SDR repository, a SEL, FRU inventory devices,
+sensors whose readings follow a function of time, the watchdog timer, the
+PICMG hot-swap states and the HPM.1 firmware upload. It is meant for
+running the library without hardware, e.g. in CI or by the benchmarks:
+
+    bmc = BmcSimulator(sdrs=[full_sensor_sdr(1, 1, 'Temp', 0x01)],
+            sensors={1: ramp(0x20, 1)})
+    bmc.start()
+    # Open IPMI RMCP Connection | 127.0.0.1 | 0x20 | port=${bmc.port}
+    bmc.stop()
+"""
+
+import math
+import socket
+import struct
+import threading
+import time
+import uuid
+
+import pyipmi
+from pyipmi.interfaces.ipmb import checksum
+from pyipmi.interfaces.rmcp import (RmcpMsg, IpmiMsg, AsfPing, AsfPong,
+        RMCP_CLASS_ASF, RMCP_CLASS_IPMI)
+from pyipmi.msgs import (constants, create_message, create_response_message,
+        encode_message, decode_message)
+
+SDR_TYPE_FULL_SENSOR_RECORD = 0x01
+SDR_TYPE_COMPACT_SENSOR_RECORD = 0x02
+SDR_TYPE_FRU_DEVICE_LOCATOR_RECORD = 0x11
+
+SENSOR_TYPE_FRU_HOT_SWAP = 0xf0
+
+TEMPORARY_SESSION_ID = 0x11223344
+
+
+def _sdr_header(record_id, record_type, body):
+    return struct.pack('<HBBB', record_id, 0x51, record_type, len(body)) \
+            + body
+
+
+def _id_string(name):
+    name = name.encode('ascii')
+    return bytes((0xc0 | len(name),)) + name
+
+
+def full_sensor_sdr(record_id, number, name, sensor_type, m=1, b=0,
+        r_exp=0, b_exp=0, unit=0, event_reading_type=0x01, owner_id=0x20,
+        owner_lun=0, entity_id=0, entity_instance=0, thresholds=None,
+        linearization=0):
+    """Returns the raw data of a full sensor record.
+
+    The reading is converted by `y = L((m * x + b * 10^b_exp) *
+    10^r_exp)`, where `L` is the `linearization` (0 is linear).
+    `thresholds` maps the threshold names (`lnr`, ..., `unr`) to raw
+    values.
+    """
+    thresholds = thresholds or {}
+    body = struct.pack('<BBBBBBBBBHHHBBBB',
+            owner_id, owner_lun, number, entity_id, entity_instance,
+            0x7f, 0x68, sensor_type, event_reading_type,
+            0, 0, 0x3f3f, 0x00, unit, 0, linearization)
+    body += struct.pack('<BBBBBB',
+            m & 0xff, (m >> 2) & 0xc0,
+            b & 0xff, (b >> 2) & 0xc0,
+            0,
+            ((r_exp & 0xf) << 4) | (b_exp & 0xf))
+    body += bytes((0, 0, 0, 0, 0xff, 0))
+    body += bytes([thresholds.get(t, 0) for t in
+            ('unr', 'ucr', 'unc', 'lnr', 'lcr', 'lnc')])
+    body += bytes((0, 0, 0, 0, 0))
+    body += _id_string(name)
+    return _sdr_header(record_id, SDR_TYPE_FULL_SENSOR_RECORD, body)
+
+
+def compact_sensor_sdr(record_id, number, name, sensor_type,
+        event_reading_type=0x6f, owner_id=0x20, entity_id=0,
+        entity_instance=0):
+    """Returns the raw data of a compact sensor record."""
+    body = struct.pack('<BBBBBBBBBHHHBBBHBB3xB',
+            owner_id, 0, number, entity_id, entity_instance,
+            0x7f, 0x68, sensor_type, event_reading_type,
+            0, 0, 0x7fff, 0, 0, 0, 0, 0, 0, 0)
+    body += _id_string(name)
+    return _sdr_header(record_id, SDR_TYPE_COMPACT_SENSOR_RECORD, body)
+
+
+def fru_device_locator_sdr(record_id, fru_id, name, device_address=0x20,
+        entity_id=0, entity_instance=0):
+    """Returns the raw data of a FRU device locator record of a logical
+    FRU device."""
+    body = struct.pack('<BBBBBBBBBB',
+            device_address, fru_id, 0x80, 0, 0, 0x10, 0, entity_id,
+            entity_instance, 0)
+    body += _id_string(name)
+    return _sdr_header(record_id, SDR_TYPE_FRU_DEVICE_LOCATOR_RECORD, body)
+
+
+def sel_entry(record_id, timestamp, sensor_type, sensor_number,
+        event_type=0x6f, event_data=(0, 0xff, 0xff), deassertion=False,
+        generator_id=0x0020):
+    """Returns the raw data of a system event record."""
+    event_dir_type = event_type | (0x80 if deassertion else 0)
+    return struct.pack('<HBIHBBBB3B', record_id, 0x02, int(timestamp),
+            generator_id, 0x04, sensor_type, sensor_number, event_dir_type,
+            *event_data)
+
+
+def fru_image(size=2048):
+    """Returns a FRU inventory of `size` bytes with an empty common
+    header."""
+    header = bytes((1, 0, 0, 0, 0, 0, 0))
+    data = bytearray(size)
+    data[0:8] = header + bytes((checksum(header),))
+    return data
+
+
+def constant(raw):
+    """A sensor waveform with a constant raw reading."""
+    return lambda t: raw
+
+
+def ramp(start, per_second, minimum=0, maximum=255):
+    """A sensor waveform rising (or falling) by `per_second` per second and
+    saturating at `minimum` and `maximum`."""
+    return lambda t: int(max(minimum, min(maximum, start + per_second * t)))
+
+
+def sine(center, amplitude, period):
+    """A sensor waveform oscillating around `center`."""
+    return lambda t: int(round(center
+            + amplitude * math.sin(2 * math.pi * t / period)))
+
+
+class BmcSimulator(object):
+    """A simulated BMC listening on a local UDP port.
+
+    `sdrs` is a list of raw SDRs (see `full_sensor_sdr` and others), which
+    are provided as device SDRs and in the SDR repository. `sel` is a list
+    of raw SEL entries (see `sel_entry`). `fru` maps FRU device ids to the
+    FRU data. `sensors` maps sensor numbers to a function of the time since
+    start returning the raw reading, or a tuple of the raw reading and the
+    states. `hotswap_sensors` maps the numbers of FRU hot-swap sensors to
+    their FRU device id.
+
+    If `max_fru_read` is given, Read FRU Data requests for more bytes are
+    rejected with completion code `max_fru_read_cc`, 0xCA by default.
+    `guid` is the 16 byte device GUID, a random one by default. With an
+    empty `guid` the Get Device GUID command is not supported.
+
+    `ipmcs` maps the IPMB addresses of IPM controllers behind the BMC (e.g.
+    the blades of a shelf manager) to their simulators, which are created
+    with `host=None` and not started. Requests bridged to them with Send
+    Message are answered by them.
+
+    The simulator accepts one session at a time with any user name, the
+    password is only checked if `password` is given. Requests of other
+    sessions are not answered. Only the authentication types none and
+    straight password are supported.
+
+    Only IPMI v1.5 sessions over RMCP are simulated. RMCP+ (IPMI v2.0
+    sessions, e.g. `ipmitool -I lanplus`) is not supported, so the
+    benchmarks do not cover its authentication and encryption overhead.
+    """
+
+    def __init__(self, sdrs=(), sel=(), fru=None, sensors=None,
+            hotswap_sensors=None, host='127.0.0.1', port=0, password=None,
+            manufacturer_id=0x3a98, product_id=0x1234, max_fru_read=None,
+            guid=None, max_fru_read_cc=constants.CC_CANT_RET_NUM_REQ_BYTES,
+            ipmcs=None):
+        self.sdrs = [bytes(sdr) for sdr in sdrs]
+        self.sel = [bytes(entry) for entry in sel]
+        self.fru = dict((fru_id, bytearray(data))
+                for (fru_id, data) in (fru or {0: fru_image()}).items())
+        self.sensors = dict(sensors or {})
+        self.hotswap_sensors = dict(hotswap_sensors or {})
+        self.hotswap_states = dict((fru_id, 4)
+                for fru_id in self.hotswap_sensors.values())
+        self.password = password
+        self.manufacturer_id = manufacturer_id
+        self.product_id = product_id
+        self.max_fru_read = max_fru_read
+        self.max_fru_read_cc = max_fru_read_cc
+        self.guid = uuid.uuid4().bytes if guid is None else bytes(guid)
+        self.ipmcs = dict(ipmcs or {})
+
+        self.sdr_timestamp = int(time.time())
+        self.sel_addition = int(time.time())
+        self.sel_erase = 0
+        self.watchdog = None
+        self.hpm = {'action': None, 'image': bytearray(),
+                'last_completion_code': 0, 'activated': None}
+        self.lock = threading.RLock()
+
+        self._reservation_id = 0
+        self._session = None
+        self._sessions = 0
+        self._sock = None
+        self.host = self.port = None
+        if host is not None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.bind((host, port))
+            self.host, self.port = self._sock.getsockname()
+        self._thread = None
+        self._running = False
+        self._start_time = time.time()
+
+    def start(self):
+        self._running = True
+        self._start_time = time.time()
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self._sock.close()
+
+    def drop_session(self):
+        """Forgets the active session like after a BMC reset, its requests
+        are not answered any more."""
+        with self.lock:
+            self._session = None
+
+    def add_sel_entry(self, sensor_type, sensor_number, event_type=0x6f,
+            event_data=(0, 0xff, 0xff), deassertion=False):
+        """Adds a system event record to the SEL."""
+        with self.lock:
+            self.sel_addition = int(time.time())
+            self.sel.append(sel_entry(len(self.sel) + 1, self.sel_addition,
+                    sensor_type, sensor_number, event_type, event_data,
+                    deassertion))
+
+    def _serve(self):
+        self._sock.settimeout(0.1)
+        while self._running:
+            try:
+                (pdu, addr) = self._sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            try:
+                reply = self._handle_packet(pdu)
+            except Exception:
+                continue
+            if reply is not None:
+                self._sock.sendto(reply, addr)
+
+    def _handle_packet(self, pdu):
+        rmcp = RmcpMsg()
+        sdu = rmcp.unpack(pdu)
+        if rmcp.class_of_msg == RMCP_CLASS_ASF:
+            ping = AsfPing()
+            ping.unpack(sdu)
+            pong = AsfPong()
+            pong.tag = ping.tag
+            pong.supported_entities = 0x81
+            return RmcpMsg(RMCP_CLASS_ASF).pack(pong.pack(), 0xff)
+
+        if rmcp.class_of_msg != RMCP_CLASS_IPMI:
+            return None
+
+        msg = IpmiMsg(ignore_sdu_length=True)
+        data = msg.unpack(sdu)
+        (session_id,) = struct.unpack_from('<I', sdu, 5)
+        if session_id not in (0, TEMPORARY_SESSION_ID, self._session):
+            return None
+        if self.password is not None and msg.auth_type != 0 \
+                and bytes(msg.auth_code).rstrip(b'\x00') \
+                != self.password.encode():
+            return None
+
+        response = self._handle_ipmb_message(bytes(data))
+
+        session = pyipmi.Session()
+        session.auth_type = msg.auth_type
+        session.sid = msg.session_id
+        session.sequence_number = 0
+        if msg.auth_type != 0:
+            session.set_auth_type_user('', self.password or '')
+            session.auth_type = msg.auth_type
+        return RmcpMsg(RMCP_CLASS_IPMI).pack(IpmiMsg(session).pack(response),
+                0xff)
+
+    def _handle_ipmb_message(self, data):
+        (rs_sa, netfn_lun, _, rq_sa, seq_lun, cmdid) = data[:6]
+        netfn = netfn_lun >> 2
+        payload = data[6:-1]
+
+        group_extension = None
+        if netfn == constants.NETFN_GROUP_EXTENSION and payload:
+            group_extension = payload[0]
+
+        if (netfn == constants.NETFN_APP
+                and cmdid == constants.CMDID_SEND_MESSAGE and payload):
+            rsp_data = self._bridge(payload)
+        else:
+            rsp_data = self._dispatch(netfn, cmdid, group_extension, payload)
+
+        header = bytes((rq_sa, ((netfn | 1) << 2) | (seq_lun & 3)))
+        body = bytes((rs_sa, (seq_lun & 0xfc) | (netfn_lun & 3), cmdid)) \
+                + rsp_data
+        return header + bytes((checksum(header),)) + body \
+                + bytes((checksum(body),))
+
+    def _bridge(self, payload):
+        """Passes the message of a Send Message request to the IPM
+        controller it is addressed to, the response is returned with the
+        Send Message response."""
+        data = payload[1:]
+        ipmc = self.ipmcs.get(data[0]) if data else None
+        if ipmc is None:
+            return bytes((constants.CC_DESTINATION_UNAVAILABLE,))
+        return bytes((constants.CC_OK,)) + ipmc._handle_ipmb_message(data)
+
+    def _dispatch(self, netfn, cmdid, group_extension, payload):
+        try:
+            req = create_message(netfn, cmdid, group_extension)
+        except KeyError:
+            return bytes((constants.CC_INV_CMD,))
+        try:
+            decode_message(req, payload)
+        except Exception:
+            return bytes((constants.CC_REQ_DATA_INV_LENGTH,))
+
+        handler = getattr(self, '_handle_' + type(req).__name__[:-3], None)
+        if handler is None:
+            return bytes((constants.CC_INV_CMD,))
+
+        rsp = create_response_message(req)
+        try:
+            with self.lock:
+                cc = handler(req, rsp)
+            if cc:
+                return bytes((cc,))
+            rsp.completion_code = 0
+            return encode_message(rsp)
+        except Exception:
+            return bytes((constants.CC_UNSPECIFIED_ERROR,))
+
+    def _next_reservation(self, req, rsp):
+        self._reservation_id = (self._reservation_id % 0xffff) + 1
+        rsp.reservation_id = self._reservation_id
+
+    # session setup
+
+    def _handle_GetChannelAuthenticationCapabilities(self, req, rsp):
+        rsp.channel_number = 1
+        rsp.support.none = 1
+        rsp.support.straight = 1
+
+    def _handle_GetSessionChallenge(self, req, rsp):
+        rsp.temporary_session_id = TEMPORARY_SESSION_ID
+        rsp.challenge_string = b'\x01' * 16
+
+    def _handle_ActivateSession(self, req, rsp):
+        self._sessions += 1
+        self._session = 0x55667700 + self._sessions
+        rsp.authentication.type = req.authentication.type
+        rsp.session_id = self._session
+        rsp.initial_inbound_sequence_number = 1
+        rsp.privilege_level.maximum_allowed = 4
+
+    def _handle_SetSessionPrivilegeLevel(self, req, rsp):
+        rsp.privilege_level.new = req.privilege_level.requested
+
+    def _handle_CloseSession(self, req, rsp):
+        self._session = None
+
+    # BMC device and watchdog
+
+    def _handle_GetDeviceId(self, req, rsp):
+        rsp.device_id = 0x12
+        rsp.device_revision.provides_device_sdrs = 1
+        rsp.firmware_revision.major = 1
+        rsp.firmware_revision.minor = 0x23
+        rsp.ipmi_version = 0x51
+        rsp.additional_support.sensor = 1
+        rsp.additional_support.sdr_repository = 1
+        rsp.additional_support.sel = 1
+        rsp.additional_support.fru_inventory = 1
+        rsp.manufacturer_id = self.manufacturer_id
+        rsp.product_id = self.product_id
+
+    def _handle_GetDeviceGuid(self, req, rsp):
+        if not self.guid:
+            return constants.CC_INV_CMD
+        rsp.device_guid = list(self.guid)
+
+    def _handle_SetWatchdogTimer(self, req, rsp):
+        self.watchdog = {
+            'timer_use': req.timer_use.timer_use,
+            'dont_log': req.timer_use.dont_log,
+            'timeout_action': req.timer_actions.timeout_action,
+            'pre_timeout_interrupt': req.timer_actions.pre_timeout_interrupt,
+            'pre_timeout_interval': req.pre_timeout_interval,
+            'timer_use_expiration_flags': req.timer_use_expiration_flags,
+            'initial_countdown': req.initial_countdown,
+            'started': None,
+        }
+
+    def _handle_ResetWatchdogTimer(self, req, rsp):
+        if self.watchdog is None:
+            return 0x80
+        self.watchdog['started'] = time.time()
+
+    def _handle_GetWatchdogTimer(self, req, rsp):
+        wd = self.watchdog
+        if wd is None:
+            return
+        rsp.timer_use.timer_use = wd['timer_use']
+        rsp.timer_use.dont_log = wd['dont_log']
+        rsp.timer_actions.timeout_action = wd['timeout_action']
+        rsp.timer_actions.pre_timeout_interrupt = wd['pre_timeout_interrupt']
+        rsp.pre_timeout_interval = wd['pre_timeout_interval']
+        rsp.timer_use_expiration_flags = wd['timer_use_expiration_flags']
+        rsp.initial_countdown = wd['initial_countdown']
+        present = wd['initial_countdown']
+        if wd['started'] is not None:
+            elapsed = int((time.time() - wd['started']) * 10)
+            present = max(0, present - elapsed)
+            rsp.timer_use.is_running = 1 if present > 0 else 0
+        rsp.present_countdown = present
+
+    # SDR repository and sensors
+
+    def _get_sdr(self, req, rsp):
+        if not self.sdrs:
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        if req.record_id == 0:
+            index = 0
+        elif req.record_id == 0xffff:
+            index = len(self.sdrs) - 1
+        else:
+            index = req.record_id - 1
+        if index >= len(self.sdrs):
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        record = self.sdrs[index]
+        if index + 1 < len(self.sdrs):
+            rsp.next_record_id = index + 2
+        else:
+            rsp.next_record_id = 0xffff
+        rsp.record_data = record[req.offset:req.offset + req.bytes_to_read]
+
+    def _handle_GetSdrRepositoryInfo(self, req, rsp):
+        rsp.sdr_version = 0x51
+        rsp.record_count = len(self.sdrs)
+        rsp.free_space = 0xffff
+        rsp.most_recent_addition = self.sdr_timestamp
+        rsp.most_recent_erase = 0
+        rsp.support.reserve = 1
+
+    def _handle_GetDeviceSdrInfo(self, req, rsp):
+        rsp.number_of_sensors = min(len(self.sdrs), 0xff)
+        rsp.flags.lun0_has_sensors = 1
+        rsp.flags.dynamic_population = 1
+        rsp.sensor_population_change = self.sdr_timestamp
+
+    _handle_ReserveSdrRepository = _next_reservation
+    _handle_ReserveDeviceSdrRepository = _next_reservation
+    _handle_GetSdr = _get_sdr
+    _handle_GetDeviceSdr = _get_sdr
+
+    def _handle_GetSensorReading(self, req, rsp):
+        number = req.sensor_number
+        if number in self.hotswap_sensors:
+            state = self.hotswap_states[self.hotswap_sensors[number]]
+            rsp.sensor_reading = 0
+            rsp.states1 = (1 << state) & 0xff
+            rsp.states2 = (1 << state) >> 8
+            return
+        waveform = self.sensors.get(number)
+        if waveform is None:
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        value = waveform(time.time() - self._start_time)
+        (raw, states) = value if isinstance(value, tuple) else (value, 0)
+        rsp.sensor_reading = raw & 0xff
+        rsp.states1 = states & 0xff
+        rsp.states2 = (states >> 8) & 0x7f
+
+    # SEL
+
+    def _handle_GetSelInfo(self, req, rsp):
+        rsp.version = 0x51
+        rsp.entries = len(self.sel)
+        rsp.free_bytes = 0xffff
+        rsp.most_recent_addition = self.sel_addition
+        rsp.most_recent_erase = self.sel_erase
+        rsp.operation_support.reserve_sel = 1
+
+    _handle_ReserveSel = _next_reservation
+
+    def _handle_GetSelEntry(self, req, rsp):
+        if not self.sel:
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        if req.record_id == 0:
+            index = 0
+        elif req.record_id == 0xffff:
+            index = len(self.sel) - 1
+        else:
+            index = req.record_id - 1
+        if index >= len(self.sel):
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        if index + 1 < len(self.sel):
+            rsp.next_record_id = index + 2
+        else:
+            rsp.next_record_id = 0xffff
+        rsp.record_data = self.sel[index][req.offset:req.offset + req.length]
+
+    def _handle_ClearSel(self, req, rsp):
+        if req.cmd == 0xaa:
+            self.sel = []
+            self.sel_erase = int(time.time())
+        rsp.status.erase_in_progress = 1
+
+    def _handle_GetSelTime(self, req, rsp):
+        rsp.timestamp = int(time.time())
+
+    # FRU
+
+    def _handle_GetFruInventoryAreaInfo(self, req, rsp):
+        if req.fru_id not in self.fru:
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        rsp.area_size = len(self.fru[req.fru_id])
+        rsp.area_info.access = 0
+
+    def _handle_ReadFruData(self, req, rsp):
+        if req.fru_id not in self.fru:
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        if self.max_fru_read is not None and req.count > self.max_fru_read:
+            return self.max_fru_read_cc
+        data = self.fru[req.fru_id][req.offset:req.offset + req.count]
+        rsp.count = len(data)
+        rsp.data = data
+
+    def _handle_WriteFruData(self, req, rsp):
+        if req.fru_id not in self.fru:
+            return constants.CC_REQ_DATA_NOT_PRESENT
+        fru = self.fru[req.fru_id]
+        data = bytes(req.data)
+        if req.offset + len(data) > len(fru):
+            return constants.CC_PARAM_OUT_OF_RANGE
+        fru[req.offset:req.offset + len(data)] = data
+        rsp.count_written = len(data)
+
+    # PICMG
+
+    def _handle_GetPicmgProperties(self, req, rsp):
+        rsp.extension_version = 0x32
+        rsp.max_fru_device_id = max(self.fru) if self.fru else 0
+        rsp.fru_device_id = 0
+
+    def _handle_SetFruActivation(self, req, rsp):
+        if req.fru_id not in self.hotswap_states:
+            return constants.CC_PARAM_OUT_OF_RANGE
+        self.hotswap_states[req.fru_id] = 4 if req.control == 1 else 1
+
+    # HPM.1 firmware upgrade
+
+    def _handle_GetTargetUpgradeCapabilities(self, req, rsp):
+        rsp.hpm_1_version = 0
+        rsp.capabilities.manual_rollback = 1
+        rsp.timeout.upgrade = 10
+        rsp.timeout.selftest = 10
+        rsp.timeout.rollback = 10
+        rsp.timeout.inaccessibility = 10
+        rsp.component_present = 0x01
+
+    def _handle_GetUpgradeStatus(self, req, rsp):
+        rsp.command_in_progress = 0
+        rsp.last_completion_code = self.hpm['last_completion_code']
+
+    def _handle_InitiateUpgradeAction(self, req, rsp):
+        self.hpm['action'] = req.action
+        self.hpm['image'] = bytearray()
+
+    def _handle_UploadFirmwareBlock(self, req, rsp):
+        if self.hpm['action'] is None:
+            return 0xd5
+        self.hpm['image'] += bytes(req.data)
+
+    def _handle_FinishFirmwareUpload(self, req, rsp):
+        if req.image_length != len(self.hpm['image']):
+            self.hpm['last_completion_code'] = 0x81
+            return 0x81
+        self.hpm['last_completion_code'] = 0
+
+    def _handle_ActivateFirmware(self, req, rsp):
+        self.hpm['activated'] = bytes(self.hpm['image'])
+        self.hpm['action'] = None
+
+    def _handle_AbortFirmwareUpgrade(self, req, rsp):
+        self.hpm['action'] = None
+        self.hpm['image'] = bytearray()
@@ -0,0 +1,116 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyipmi.msgs.registry import DEFAULT_REGISTRY
+
+
+class LatencyHistogram(object):
+    """A histogram of latencies with a relative precision of about 1%.
+
+    The latencies are counted in microseconds. Values below 128 have a
+    bucket each, above the buckets grow exponentially with 64 buckets per
+    power of two, like in an HDR histogram. Only used buckets are stored.
+    """
+
+    SUB_BUCKET_BITS = 7
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _index(cls, us):
+        shift = max(us.bit_length() - cls.SUB_BUCKET_BITS, 0)
+        return (shift, us >> shift)
+
+    @staticmethod
+    def _value(index):
+        (shift, sub_bucket) = index
+        # the middle of the bucket
+        return ((sub_bucket << shift) + ((1 << shift) >> 1)) / 1e6
+
+    def record(self, seconds):
+        index = self._index(int(seconds * 1e6))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """Returns the latency in seconds below which `percent` percent of
+        the recorded latencies are."""
+        if self.count == 0:
+            return None
+        threshold = self.count * percent / 100.0
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= threshold:
+                return min(self._value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+
+class CommandStatistics(object):
+    """Statistics of one IPMI command."""
+
+    def __init__(self, netfn, cmdid, group_extension=None):
+        self.netfn = netfn
+        self.cmdid = cmdid
+        self.group_extension = group_extension
+        self.latencies = LatencyHistogram()
+        self.completion_codes = {}
+        self.timeouts = 0
+        self.errors = 0
+
+    @property
+    def name(self):
+        try:
+            cls = DEFAULT_REGISTRY.registry[(self.netfn, self.cmdid,
+                    self.group_extension)]
+            name = cls.__name__[:-3]
+        except KeyError:
+            name = 'Unknown'
+        return '%s (%02Xh/%02Xh)' % (name, self.netfn, self.cmdid)
+
+    @property
+    def retries(self):
+        """Requests which had to be sent again because the target was busy
+        or did not answer."""
+        return self.completion_codes.get(0xc0, 0) + self.timeouts
+
+    def as_dict(self):
+        return {
+            'count': self.latencies.count + self.timeouts + self.errors,
+            'retries': self.retries,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'completion_codes': dict(self.completion_codes),
+            'min': self.latencies.min,
+            'mean': self.latencies.mean,
+            'p50': self.latencies.percentile(50),
+            'p99': self.latencies.percentile(99),
+            'max': self.latencies.max,
+        }
@@ -0,0 +1,142 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import struct
+import time
+
+from pyipmi.errors import IpmiTimeoutError
+from pyipmi.interfaces.base import Interface
+
+TRACE_MAGIC = b'IPMITRC1'
+
+STATUS_OK = 0
+STATUS_TIMEOUT = 1
+STATUS_ERROR = 2
+
+# start offset, latency, status, lun, netfn and the lengths of the target
+# key, the request and the response
+_RECORD = struct.Struct('<ddBBBHHH')
+
+TraceRecord = collections.namedtuple('TraceRecord', ['offset', 'latency',
+        'status', 'target', 'lun', 'netfn', 'request', 'response'])
+
+
+def target_key(target):
+    """Returns a string identifying the target of a request."""
+    routing = None
+    if target.routing is not None:
+        routing = [(r.rq_sa, r.rs_sa, r.channel) for r in target.routing]
+    return repr((target.ipmb_address, routing))
+
+
+class TraceWriter(object):
+    """Writes request/response pairs to a trace file.
+
+    The file starts with `TRACE_MAGIC`, followed by one record per
+    request. A record is a fixed header followed by the target key, the
+    raw request (starting with the command id) and the raw response
+    (starting with the completion code) or the error message.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(TRACE_MAGIC)
+        self._start = time.time()
+
+    def write(self, start, latency, status, target, lun, netfn, request,
+            response):
+        target = target_key(target).encode('utf-8')
+        self._file.write(_RECORD.pack(start - self._start, latency, status,
+                lun, netfn, len(target), len(request), len(response)))
+        self._file.write(target)
+        self._file.write(request)
+        self._file.write(response)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_trace(path):
+    """Returns the list of `TraceRecord`s of a trace file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise RuntimeError('%s is not a trace file' % path)
+
+    records = []
+    offset = len(TRACE_MAGIC)
+    while offset < len(data):
+        (start, latency, status, lun, netfn, target_len, request_len,
+                response_len) = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        target = data[offset:offset+target_len].decode('utf-8')
+        offset += target_len
+        request = data[offset:offset+request_len]
+        offset += request_len
+        response = data[offset:offset+response_len]
+        offset += response_len
+        records.append(TraceRecord(start, latency, status, target, lun,
+                netfn, request, response))
+    return records
+
+
+class ReplayInterface(Interface):
+    """Answers requests from a trace file written by a recording interface.
+
+    Requests are matched by target, LUN, network function and request
+    data. Identical requests are answered with the recorded responses in
+    their recorded order, once exhausted the last response is repeated.
+
+    If `speed` is given, the recorded latency divided by `speed` is waited
+    before a response is returned (e.g. 1 for the recorded speed),
+    otherwise the responses are returned at once.
+    """
+
+    NAME = 'replay'
+
+    def __init__(self, trace_file, speed=None, max_retries=0):
+        self.speed = speed
+        self._responses = {}
+        for record in read_trace(trace_file):
+            key = (record.target, record.lun, record.netfn, record.request)
+            self._responses.setdefault(key, collections.deque()) \
+                    .append(record)
+
+    def establish_session(self, session):
+        pass
+
+    def close_session(self):
+        pass
+
+    def set_timeout(self, timeout):
+        pass
+
+    def send_and_receive_raw(self, target, lun, netfn, raw_bytes):
+        key = (target_key(target), lun, netfn, bytes(raw_bytes))
+        records = self._responses.get(key)
+        if not records:
+            raise RuntimeError('Request %02Xh/%s to %s not in trace' % (netfn,
+                    bytes(raw_bytes).hex(), key[0]))
+        record = records.popleft() if len(records) > 1 else records[0]
+
+        if self.speed:
+            time.sleep(record.latency / self.speed)
+
+        if record.status == STATUS_TIMEOUT:
+            raise IpmiTimeoutError()
+        elif record.status == STATUS_ERROR:
+            raise RuntimeError(record.response.decode('utf-8'))
+        return record.response
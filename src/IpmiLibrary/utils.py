@@ -12,21 +12,65 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import difflib
+
 from robot.utils import normalizing
 
+# normalized attribute name -> value, per object
+_attribute_indexes = {}
+
+# normalized names (without the prefix) -> attribute name, per object/prefix
+_attribute_families = {}
+
+def _normalize(name):
+    return normalizing.normalize(name, ignore='_')
+
+def _attribute_index(obj):
+    try:
+        return _attribute_indexes[obj]
+    except KeyError:
+        index = {}
+        for i_attr in dir(obj):
+            index.setdefault(_normalize(i_attr), getattr(obj, i_attr))
+        _attribute_indexes[obj] = index
+        return index
+
+def _attribute_family(obj, prefix):
+    try:
+        return _attribute_families[(obj, prefix)]
+    except KeyError:
+        normalized_prefix = _normalize(prefix)
+        family = {}
+        for i_attr in dir(obj):
+            normalized_i_attr = _normalize(i_attr)
+            if normalized_i_attr.startswith(normalized_prefix):
+                family.setdefault(normalized_i_attr[len(normalized_prefix):],
+                        i_attr[len(prefix):])
+        _attribute_families[(obj, prefix)] = family
+        return family
+
 def find_attribute(obj, attr, prefix):
+    """Returns the attribute `prefix` + `attr` of `obj`.
+
+    The names are compared case and underscore insensitive, an index of
+    the normalized names is built on first use for every object. If there
+    is no such attribute, `attr` is parsed as an integer.
+    """
     attr = str(attr)
-    for i_attr in dir(obj):
-        normalized_i_attr = normalizing.normalize(i_attr, ignore='_')
-        normalized_attr = normalizing.normalize(prefix + attr,
-                ignore='_')
-        if normalized_i_attr == normalized_attr:
-            return getattr(obj, i_attr)
+    try:
+        return _attribute_index(obj)[_normalize(prefix + attr)]
+    except KeyError:
+        pass
 
     try:
         attr = int(attr, 0)
         return attr
     except ValueError:
+        family = _attribute_family(obj, prefix)
+        matches = difflib.get_close_matches(_normalize(attr), family, 1)
+        if matches:
+            raise RuntimeError('Attribute "%s" in "%s" not found. '
+                    'Did you mean "%s"?' % (attr, obj, family[matches[0]]))
         raise RuntimeError('Attribute "%s" in "%s" not found.' % (attr, obj))
 
 def int_any_base(i, base=0):
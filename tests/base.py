@@ -0,0 +1,50 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from IpmiLibrary import IpmiLibrary
+from IpmiLibrary.simulator import BmcSimulator
+
+
+class SimulatorTestCase(unittest.TestCase):
+    """Runs the library against a simulated BMC.
+
+    `create_simulator` returns the simulator of a test case, the library
+    is connected to it with `interface_type`.
+    """
+
+    interface_type = 'rmcp'
+
+    def create_simulator(self):
+        return BmcSimulator()
+
+    def setUp(self):
+        self.bmc = self.create_simulator()
+        self.bmc.start()
+        self.lib = IpmiLibrary(timeout=2.0, poll_interval=0.01)
+        self.lib.open_ipmi_lan_connection('127.0.0.1', 0x20,
+                port=self.bmc.port, interface_type=self.interface_type)
+
+    def tearDown(self):
+        self.lib.close_all_ipmi_connections()
+        self.bmc.stop()
+
+    def request_count(self, name):
+        """Returns the number of `name` requests sent since the last
+        `Reset IPMI Statistics`."""
+        for (command, stats) in self.lib.get_ipmi_statistics().items():
+            if command.split(' ')[0] == name:
+                return stats['count']
+        return 0
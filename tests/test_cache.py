@@ -0,0 +1,80 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+
+from IpmiLibrary.simulator import BmcSimulator, fru_image
+
+from .base import SimulatorTestCase
+
+
+def serial_fru_image(serial):
+    data = fru_image(256)
+    data[0x80:0x80 + len(serial)] = serial
+    return data
+
+
+class TestFileCache(SimulatorTestCase):
+    guid = None
+
+    def create_simulator(self):
+        return BmcSimulator(fru={0: serial_fru_image(b'UNIT-A')},
+                guid=self.guid)
+
+    def setUp(self):
+        super(TestFileCache, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.lib.set_cache_directory(self.cache_dir)
+
+    def tearDown(self):
+        super(TestFileCache, self).tearDown()
+        shutil.rmtree(self.cache_dir)
+
+    def test_fru_data_is_loaded_from_cache(self):
+        self.lib.prefetch_fru_data()
+        self.lib.close_all_ipmi_connections()
+        self.lib.open_ipmi_lan_connection('127.0.0.1', 0x20,
+                port=self.bmc.port, interface_type=self.interface_type)
+
+        self.lib.reset_ipmi_statistics()
+        self.lib.prefetch_fru_data()
+        self.assertEqual(self.request_count('ReadFruData'), 0)
+
+    def test_other_unit_is_not_loaded_from_cache(self):
+        self.lib.prefetch_fru_data()
+
+        other = BmcSimulator(fru={0: serial_fru_image(b'UNIT-B')},
+                guid=self.guid)
+        other.start()
+        try:
+            self.lib.open_ipmi_lan_connection('127.0.0.1', 0x20,
+                    port=other.port, interface_type=self.interface_type)
+            self.lib.prefetch_fru_data()
+            self.lib.fru_data_at_offset_should_be(0x80,
+                    ' '.join(str(b) for b in b'UNIT-B'))
+        finally:
+            self.lib.close_all_ipmi_connections()
+            other.stop()
+
+
+class TestFileCacheWithoutGuid(TestFileCache):
+    guid = b''
+
+    def test_unknown_unit_is_not_cached(self):
+        del self.lib._cp['unit_address']
+        self.lib.prefetch_fru_data()
+        self.lib.reset_ipmi_statistics()
+        self.lib.prefetch_fru_data()
+        self.assertGreater(self.request_count('ReadFruData'), 0)
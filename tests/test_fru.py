@@ -0,0 +1,173 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from pyipmi.interfaces.ipmb import checksum
+from pyipmi.msgs import constants
+
+from IpmiLibrary.fru import _fru_write_ranges
+from IpmiLibrary.simulator import BmcSimulator, fru_device_locator_sdr
+
+from .base import SimulatorTestCase
+
+FRU_SIZE = 2048
+FRU_DATA = bytes(range(256)) * (FRU_SIZE // 256)
+
+
+def board_fru_image(size, manufacturer=b'ACME'):
+    """Returns a FRU inventory of `size` bytes with a board info area."""
+    area = bytearray((1, 0, 25, 0, 0, 0))
+    for field in (manufacturer, b'Board', b'1234', b'PN-1', b''):
+        area += bytes((0xc0 | len(field),)) + field
+    area += b'\xc1'
+    area += bytes(-(len(area) + 1) % 8)
+    area[1] = (len(area) + 1) // 8
+    area.append(checksum(area))
+    header = bytes((1, 0, 0, 1, 0, 0, 0))
+
+    data = bytearray(size)
+    data[0:8] = header + bytes((checksum(header),))
+    data[8:8 + len(area)] = area
+    return bytes(data)
+
+
+class TestFruWriteRanges(unittest.TestCase):
+    def test_unchanged(self):
+        self.assertEqual(_fru_write_ranges(FRU_DATA, FRU_DATA, 16), [])
+
+    def test_close_runs_are_merged(self):
+        new = bytearray(FRU_DATA)
+        new[10] ^= 0xff
+        new[14] ^= 0xff
+        new[100] ^= 0xff
+        self.assertEqual(_fru_write_ranges(FRU_DATA, new, 16),
+                [(10, 5), (100, 1)])
+
+    def test_long_runs_are_split(self):
+        new = bytearray(FRU_DATA)
+        new[0:40] = b'\xff' * 40
+        self.assertEqual(_fru_write_ranges(FRU_DATA, new, 16),
+                [(0, 16), (16, 16), (32, 8)])
+
+
+class TestFruRead(SimulatorTestCase):
+    def create_simulator(self):
+        return BmcSimulator(fru={0: FRU_DATA}, max_fru_read=40)
+
+    def test_prefetch_with_backoff(self):
+        self.lib.prefetch_fru_data()
+        self.assertEqual(bytes(self.lib._cp['prefetched_fru_data'][0]),
+                FRU_DATA)
+        # a few rejected probes, then reads of the largest accepted count
+        self.assertLessEqual(self.request_count('ReadFruData'),
+                FRU_SIZE // 40 + 1 + 10)
+
+    def test_read_fru_data(self):
+        self.assertEqual(bytes(self.lib.read_fru_data(0x3f0, 0x30)),
+                FRU_DATA[0x3f0:0x420])
+
+    def test_rejected_tail_keeps_chunk_size(self):
+        self.lib.prefetch_fru_data()
+        self.assertEqual(self.lib._cp['fru_read_counts'][0], 40)
+
+        # the FRU device now accepts fewer bytes, the last chunk of 32
+        # bytes is rejected too but must not lower the chunk size below 20
+        self.bmc.max_fru_read = 30
+        self.assertEqual(bytes(self.lib.read_fru_data(0, 152)),
+                FRU_DATA[:152])
+        self.assertEqual(self.lib._cp['fru_read_counts'][0], 20)
+
+
+class TestFruReadPipelined(TestFruRead):
+    interface_type = 'pipelinedrmcp'
+
+
+class TestFruReadUnknownError(SimulatorTestCase):
+    def create_simulator(self):
+        return BmcSimulator(fru={0: FRU_DATA}, max_fru_read=64,
+                max_fru_read_cc=constants.CC_UNSPECIFIED_ERROR)
+
+    def test_prefetch_with_backoff(self):
+        self.lib.prefetch_fru_data()
+        self.assertEqual(bytes(self.lib._cp['prefetched_fru_data'][0]),
+                FRU_DATA)
+        self.assertEqual(self.lib._cp['fru_read_counts'][0], 64)
+
+
+class TestFruInventory(SimulatorTestCase):
+    def create_simulator(self):
+        return BmcSimulator(fru={0: board_fru_image(8192)})
+
+    def test_board_area_is_read_exactly(self):
+        self.lib.reset_ipmi_statistics()
+        self.assertEqual(self.lib.fru_data_get_board_manufacturer(), 'ACME')
+        # the common header, the area header and the rest of the area
+        self.assertEqual(self.request_count('ReadFruData'), 3)
+
+
+class TestDiscoverFruInventory(SimulatorTestCase):
+    def create_simulator(self):
+        # IPMB messages are limited to 32 bytes
+        blade = BmcSimulator(host=None,
+                fru={0: board_fru_image(256, b'BLADE')}, max_fru_read=24)
+        return BmcSimulator(
+                sdrs=[fru_device_locator_sdr(1, 0, 'ShMC'),
+                        fru_device_locator_sdr(2, 0, 'Blade',
+                                device_address=0x82),
+                        fru_device_locator_sdr(3, 0, 'Empty slot',
+                                device_address=0x84)],
+                fru={0: board_fru_image(256, b'SHMC')}, ipmcs={0x82: blade})
+
+    def test_fru_devices_of_all_controllers(self):
+        frus = self.lib.discover_fru_inventory()
+        self.assertEqual(sorted(frus), [(0x20, 0), (0x82, 0)])
+        self.assertEqual(str(frus[(0x20, 0)]['inventory']
+                .board_info_area.manufacturer), 'SHMC')
+        self.assertEqual(str(frus[(0x82, 0)]['inventory']
+                .board_info_area.manufacturer), 'BLADE')
+        self.assertEqual(frus[(0x82, 0)]['name'], 'Blade')
+        # only the FRU data of the connected controller is prefetched
+        self.assertEqual(sorted(self.lib._cp['prefetched_fru_data']), [0])
+
+
+class TestDiscoverFruInventoryPipelined(TestDiscoverFruInventory):
+    interface_type = 'pipelinedrmcp'
+
+
+class TestWriteFruImage(SimulatorTestCase):
+    def create_simulator(self):
+        return BmcSimulator(fru={0: FRU_DATA})
+
+    def test_only_changed_bytes_are_written(self):
+        self.lib.prefetch_fru_data()
+        image = bytearray(FRU_DATA)
+        image[0x100:0x104] = b'ABCD'
+        image[0x500] ^= 0xff
+
+        self.lib.reset_ipmi_statistics()
+        self.assertEqual(self.lib.write_fru_image(bytes(image)), 2)
+        self.assertEqual(self.request_count('WriteFruData'), 2)
+        self.assertEqual(bytes(self.bmc.fru[0]), bytes(image))
+        self.assertEqual(bytes(self.lib._cp['prefetched_fru_data'][0]),
+                bytes(image))
+
+    def test_unchanged_image(self):
+        self.lib.reset_ipmi_statistics()
+        self.assertEqual(self.lib.write_fru_image(FRU_DATA), 0)
+        self.assertEqual(self.request_count('WriteFruData'), 0)
+
+    def test_image_too_large(self):
+        self.assertRaises(RuntimeError, self.lib.write_fru_image,
+                FRU_DATA + b'\x00')
@@ -0,0 +1,146 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import time
+
+import pyipmi.msgs
+from pyipmi.errors import RetryError
+from pyipmi.msgs import constants
+
+from IpmiLibrary.interfaces import ReconnectingInterface
+from IpmiLibrary.simulator import BmcSimulator, full_sensor_sdr, constant
+
+from .base import SimulatorTestCase
+
+
+class TestReconnectingInterface(SimulatorTestCase):
+    def setUp(self):
+        super(TestReconnectingInterface, self).setUp()
+        self.lib._ipmi.interface.set_timeout(0.2)
+        # a keepalive could establish the dropped session before a request
+        self.lib.set_session_keepalive_interval(0)
+
+    def test_queue_reads_are_not_idempotent(self):
+        for name in ('GetMessage', 'ReadEventMessageBuffer'):
+            req = pyipmi.msgs.create_request_by_name(name)
+            self.assertFalse(ReconnectingInterface.is_idempotent(
+                    (req.netfn, req.cmdid, req.group_extension)))
+
+    def test_pyipmi_keepalive_is_replaced(self):
+        interface = self.lib._ipmi.interface
+        self.assertEqual(interface.keepalive_interval, 1)
+        self.assertEqual(interface._interface._interface.keep_alive_interval,
+                0)
+
+    def test_idempotent_request_is_retried(self):
+        self.bmc.drop_session()
+        self.assertEqual(self.lib.read_fru_data(0, 1), [1])
+        reconnects = self.lib.get_session_reconnects()
+        self.assertEqual(len(reconnects), 1)
+        self.assertIsNone(reconnects[0]['error'])
+
+    def test_write_is_not_retried(self):
+        self.bmc.drop_session()
+        self.lib.reset_ipmi_statistics()
+        self.assertRaises(RetryError, self.lib.write_fru_data, 0x80, '1 2')
+        self.assertEqual(self.request_count('WriteFruData'), 1)
+        self.assertEqual(len(self.lib.get_session_reconnects()), 1)
+        # the session is established again for the next request
+        self.assertEqual(self.lib.read_fru_data(0x80, 2), [0, 0])
+
+    def test_failed_keepalive_is_logged(self):
+        def refuse(req, rsp):
+            return constants.CC_INSUFFICIENT_PRIVILEGES
+        self.bmc._handle_GetSessionChallenge = refuse
+        self.addCleanup(delattr, self.bmc, '_handle_GetSessionChallenge')
+        self.bmc.drop_session()
+
+        with self.assertLogs('IpmiLibrary.interfaces', 'WARNING'):
+            self.lib.set_session_keepalive_interval(0.1)
+            deadline = time.time() + 2
+            while (not self.lib.get_session_reconnects()
+                    and time.time() < deadline):
+                time.sleep(0.05)
+            self.lib.set_session_keepalive_interval(0)
+
+        reconnects = self.lib.get_session_reconnects()
+        self.assertIsNotNone(reconnects[0]['error'])
+
+
+class TestReconnectingInterfacePipelined(TestReconnectingInterface):
+    interface_type = 'pipelinedrmcp'
+
+
+class TestPipelinedRequests(SimulatorTestCase):
+    interface_type = 'pipelinedrmcp'
+
+    def create_simulator(self):
+        return BmcSimulator(
+                sdrs=[full_sensor_sdr(n, n, 'Sensor %d' % n, 0x01)
+                        for n in range(1, 4)],
+                sensors=dict((n, constant(n)) for n in range(1, 4)))
+
+    def setUp(self):
+        super(TestPipelinedRequests, self).setUp()
+        self.lib._ipmi.interface.set_timeout(0.2)
+        self.lib.prefetch_sdr_list()
+        self.lib.reset_ipmi_statistics()
+
+    def test_requests_are_counted(self):
+        self.lib.get_sensor_readings('Sensor 1', 'Sensor 2', 'Sensor 3')
+        self.assertEqual(self.request_count('GetSensorReading'), 3)
+
+    def test_requests_are_retried_after_reconnect(self):
+        self.bmc.drop_session()
+        readings = self.lib.get_sensor_readings('Sensor 1', 'Sensor 2',
+                'Sensor 3')
+        self.assertEqual(readings['Sensor 3']['reading'], 3)
+        self.assertEqual(len(self.lib.get_session_reconnects()), 1)
+
+
+class TestRecordingInterface(SimulatorTestCase):
+    interface_type = 'pipelinedrmcp'
+
+    def create_simulator(self):
+        return BmcSimulator(
+                sdrs=[full_sensor_sdr(n, n, 'Sensor %d' % n, 0x01)
+                        for n in range(1, 4)],
+                sensors=dict((n, constant(n)) for n in range(1, 4)))
+
+    def setUp(self):
+        super(TestRecordingInterface, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.trace_file = os.path.join(self.directory, 'bmc.trace')
+
+    def _open(self, interface_type):
+        self.lib.close_all_ipmi_connections()
+        self.lib.open_ipmi_lan_connection('127.0.0.1', 0x20,
+                port=self.bmc.port, interface_type=interface_type,
+                trace_file=self.trace_file)
+
+    def _run(self):
+        readings = self.lib.get_sensor_readings('Sensor 1', 'Sensor 2',
+                'Sensor 3')
+        self.lib.prefetch_fru_data()
+        return (readings, self.lib.read_fru_data(0, 8))
+
+    def test_pipelined_requests_are_replayed(self):
+        self._open('record:pipelinedrmcp')
+        recorded = self._run()
+        self._open('replay')
+        self.assertEqual(self._run(), recorded)
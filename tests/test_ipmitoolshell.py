@@ -0,0 +1,127 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pyipmi
+from pyipmi.errors import IpmiConnectionError
+
+from IpmiLibrary.ipmitoolshell import IpmitoolShell
+
+# acts like "ipmitool ... shell": answers Get Device ID and Write FRU Data,
+# rejects other commands and exits on the raw command 0x30 0xff. The echo
+# of the command line is wrapped like by readline, every 8 words.
+FAKE_IPMITOOL = r'''
+import os
+import sys
+
+with open(os.environ['FAKE_IPMITOOL_LOG'], 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\n')
+echo = os.environ.get('FAKE_IPMITOOL_ECHO')
+out = sys.stdout.buffer
+
+while True:
+    out.write(b'ipmitool> ')
+    out.flush()
+    line = sys.stdin.buffer.readline().strip()
+    if echo:
+        words = line.split()
+        out.write(b'\r\n'.join(b' '.join(words[i:i + 8])
+                for i in range(0, len(words), 8)) + b'\r\n')
+    if not line or line == b'exit':
+        break
+    data = [int(arg, 16) for arg in line.split()[1:]]
+    if data == [0x06, 0x01]:
+        out.write(b' 20 01 00 48 02 9f\n')
+    elif data[:2] == [0x0a, 0x12]:
+        out.write(b' %02x\n' % (len(data) - 5))
+    elif data == [0x30, 0xff]:
+        sys.exit(1)
+    else:
+        out.write(b'Unable to send RAW command (channel=0x0 netfn=0x%x '
+                b'lun=0x0 cmd=0x%x rsp=0xc1): Invalid command\n'
+                % (data[0], data[1]))
+'''
+
+
+class TestIpmitoolShell(unittest.TestCase):
+    echo = False
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.log = os.path.join(self.directory, 'log')
+
+        path = os.path.join(self.directory, 'ipmitool')
+        with open(path, 'w') as f:
+            f.write('#!%s\n%s' % (sys.executable, FAKE_IPMITOOL))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+        environ = {'FAKE_IPMITOOL_LOG': self.log}
+        if self.echo:
+            environ['FAKE_IPMITOOL_ECHO'] = '1'
+        patcher = mock.patch.dict(os.environ, environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        session = pyipmi.Session()
+        session.set_session_type_rmcp('10.0.0.1', 623)
+        session.set_auth_type_user('admin', 'secret')
+        self.interface = IpmitoolShell(response_timeout=5.0)
+        self.interface.IPMITOOL_PATH = path
+        self.interface.establish_session(session)
+        self.addCleanup(self.interface.close)
+        self.target = pyipmi.Target(0x20)
+
+    def starts(self):
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def test_response_is_parsed(self):
+        for _ in range(2):
+            self.assertEqual(self.interface.send_and_receive_raw(
+                    self.target, 0, 0x06, b'\x01'),
+                    b'\x00\x20\x01\x00\x48\x02\x9f')
+        self.assertEqual(len(self.starts()), 1)
+        self.assertIn('-H 10.0.0.1 -p 623', self.starts()[0])
+        self.assertTrue(self.starts()[0].endswith('-l 0 shell'))
+
+    def test_long_command(self):
+        # Write FRU Data of FRU 0 at offset 0 with 20 bytes
+        self.assertEqual(self.interface.send_and_receive_raw(
+                self.target, 0, 0x0a, b'\x12\x00\x00\x00' + bytes(range(20))),
+                b'\x00\x14')
+
+    def test_completion_code(self):
+        self.assertEqual(self.interface.send_and_receive_raw(
+                self.target, 0, 0x06, b'\x02'), b'\xc1')
+
+    def test_dead_shell_is_restarted(self):
+        self.assertRaises(IpmiConnectionError,
+                self.interface.send_and_receive_raw, self.target, 0, 0x30,
+                b'\xff')
+        self.assertEqual(self.interface.send_and_receive_raw(
+                self.target, 0, 0x06, b'\x01'),
+                b'\x00\x20\x01\x00\x48\x02\x9f')
+        self.assertEqual(len(self.starts()), 2)
+
+
+class TestIpmitoolShellEcho(TestIpmitoolShell):
+    echo = True
@@ -0,0 +1,53 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from IpmiLibrary.simulator import BmcSimulator, full_sensor_sdr, ramp
+
+from .base import SimulatorTestCase
+
+
+class TestSensorSampling(SimulatorTestCase):
+    def create_simulator(self):
+        # 'Missing' has no reading, reading it fails
+        return BmcSimulator(
+                sdrs=[full_sensor_sdr(1, 1, 'Temp', 0x01),
+                      full_sensor_sdr(2, 2, 'Missing', 0x01)],
+                sensors={1: ramp(0x20, 100)})
+
+    def setUp(self):
+        super(TestSensorSampling, self).setUp()
+        self.warnings = []
+        self.lib._warn = self.warnings.append
+
+    def test_sampled_reading(self):
+        self.lib.start_sensor_sampling('Temp', interval='10ms')
+        self.lib.wait_until_sampled_sensor_reading_satisfies('Temp',
+                'reading > 0x21')
+        self.lib.stop_sensor_sampling()
+        stats = self.lib.get_sampled_sensor_statistics('Temp')
+        self.assertGreater(stats['count'], 1)
+        self.assertGreater(stats['slope'], 0)
+        self.assertEqual(self.warnings, [])
+
+    def test_failed_readings_are_reported(self):
+        self.lib.start_sensor_sampling('Temp', 'Missing', interval='10ms')
+        self.lib.wait_until_sampled_sensor_reading_satisfies('Temp',
+                'reading > 0x21')
+        self.lib.stop_sensor_sampling()
+        self.assertEqual(len(self.warnings), 1)
+        self.assertIn('sensor readings failed while sampling',
+                self.warnings[0])
+
+        self.lib.get_sampled_sensor_statistics('Temp')
+        self.assertEqual(len(self.warnings), 1)
@@ -0,0 +1,80 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from IpmiLibrary.simulator import BmcSimulator, full_sensor_sdr, constant
+
+from .base import SimulatorTestCase
+
+
+class TestSdrCatalog(SimulatorTestCase):
+    def create_simulator(self):
+        return BmcSimulator(
+                sdrs=[full_sensor_sdr(1, 1, 'Temp', 0x01),
+                      full_sensor_sdr(2, 2, 'Vcc', 0x02, m=2)],
+                sensors={1: constant(0x20), 2: constant(0x30)})
+
+    def test_catalog_is_read_once(self):
+        self.lib.get_sensor_reading('Temp')
+        self.lib.reset_ipmi_statistics()
+        for _ in range(3):
+            self.assertEqual(self.lib.get_sensor_reading('Vcc'), 0x60)
+        self.assertEqual(self.request_count('GetDeviceSdr'), 0)
+        self.assertLessEqual(self.request_count('GetDeviceSdrInfo'), 1)
+
+    def test_revalidation_after_max_age(self):
+        self.lib.set_sdr_cache_max_age(0)
+        self.lib.get_sensor_reading('Temp')
+        self.lib.reset_ipmi_statistics()
+        self.lib.get_sensor_reading('Temp')
+        self.assertEqual(self.request_count('GetDeviceSdrInfo'), 1)
+        self.assertEqual(self.request_count('GetDeviceSdr'), 0)
+
+    def test_changed_source_is_read_again(self):
+        self.lib.set_sdr_cache_max_age(0)
+        self.lib.get_sensor_reading('Temp')
+        with self.bmc.lock:
+            self.bmc.sdrs.append(
+                    bytes(full_sensor_sdr(3, 3, 'Fan', 0x04)))
+            self.bmc.sdr_timestamp += 1
+        self.lib.sdr_should_be_present('Fan')
+
+    def test_sensor_readings_check_source_once(self):
+        self.lib.set_sdr_cache_max_age(0)
+        self.lib.get_sensor_reading('Temp')
+        self.lib.reset_ipmi_statistics()
+        readings = self.lib.get_sensor_readings('Temp', 'Vcc',
+                'sensor_type=Temperature')
+        self.assertEqual(readings['Vcc']['reading'], 0x60)
+        self.assertEqual(self.request_count('GetDeviceSdrInfo'), 1)
+
+
+class TestSensorConversion(SimulatorTestCase):
+    def create_simulator(self):
+        # 1/x is not defined for the raw reading 0
+        return BmcSimulator(
+                sdrs=[full_sensor_sdr(1, 1, 'Period', 0x01, linearization=7)],
+                sensors={1: constant(4)})
+
+    def test_nonlinear_reading(self):
+        self.assertEqual(self.lib.get_sensor_reading('Period'), 0.25)
+        self.assertEqual(self.lib.get_sensor_readings('Period'),
+                {'Period': {'reading': 0.25, 'states': 0}})
+
+
+class TestSdrCatalogPipelined(TestSdrCatalog):
+    interface_type = 'pipelinedrmcp'
+
+
+class TestSensorConversionPipelined(TestSensorConversion):
+    interface_type = 'pipelinedrmcp'
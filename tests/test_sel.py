@@ -0,0 +1,101 @@
+# Copyright 2014 Kontron Europe GmbH
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+
+from IpmiLibrary.simulator import BmcSimulator, sel_entry
+
+from .base import SimulatorTestCase
+
+
+class TestSelPolling(SimulatorTestCase):
+    def create_simulator(self):
+        return BmcSimulator(sel=[sel_entry(i + 1, 1000 + i, 0x01, i % 256)
+                for i in range(500)])
+
+    def _test_incremental_poll(self, compact):
+        if compact:
+            self.lib.prefetch_sel(compact=True)
+        self.lib.wait_until_sel_contains_sensor_type(0x01)
+
+        self.lib.reset_ipmi_statistics()
+        for number in range(3):
+            self.bmc.add_sel_entry(0x05, number)
+        self.lib.wait_until_sel_contains_x_times_sensor_type(3, 0x05)
+
+        # the last known record is read again to detect a refilled SEL
+        self.assertEqual(self.request_count('GetSelEntry'), 3 + 1)
+        self.assertEqual(len(self.lib._cp['polled_sel_records']), 503)
+
+    def test_incremental_poll(self):
+        self._test_incremental_poll(compact=False)
+
+    def test_incremental_poll_compact(self):
+        self._test_incremental_poll(compact=True)
+
+    def _test_prefetched_records_are_kept(self, compact):
+        self.lib.prefetch_sel(compact=compact)
+        self.bmc.add_sel_entry(0x05, 1)
+        self.lib._poll_sel_records()
+        self.assertEqual(len(self.lib._cp['polled_sel_records']), 501)
+        self.assertEqual(len(self.lib._cp['prefetched_sel_records']), 500)
+
+    def test_prefetched_records_are_kept(self):
+        self._test_prefetched_records_are_kept(compact=False)
+
+    def test_prefetched_records_are_kept_compact(self):
+        self._test_prefetched_records_are_kept(compact=True)
+
+    def test_poll_after_clear(self):
+        self.lib.wait_until_sel_contains_sensor_type(0x01)
+        self.lib.clear_sel()
+        self.bmc.add_sel_entry(0x05, 1)
+        self.lib.wait_until_sel_contains_sensor_type(0x05)
+        self.assertEqual(len(self.lib._cp['polled_sel_records']), 1)
+
+
+class TestSelFiles(SimulatorTestCase):
+    def create_simulator(self):
+        return BmcSimulator(sel=[sel_entry(i + 1, 1000 + i, 0x01, i)
+                for i in range(10)])
+
+    def setUp(self):
+        super(TestSelFiles, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_link_is_relative(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            path = self.lib.log_sel('sel.log')
+        self.assertEqual(os.path.dirname(path), os.getcwd())
+        self.assertIn('SEL with 10 records written to <a href="sel.log">',
+                output.getvalue())
+
+    def test_snapshot_reads_current_sel(self):
+        self.lib.prefetch_sel()
+        self.lib.export_sel('before.bin')
+        self.bmc.add_sel_entry(0x05, 1)
+        self.assertRaises(AssertionError,
+                self.lib.sel_snapshot_should_not_have_new_events,
+                'before.bin')
+        records = self.lib.get_new_sel_records('before.bin')
+        self.assertEqual([record.sensor_type for record in records], [0x05])